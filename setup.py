@@ -46,14 +46,17 @@ setuptools.setup(
         "googletrans",
         "idna==2.8",
         "langdetect==1.0.7",
+        "lxml==4.6.2",
         "nltk==3.7",
         "numpy==1.21.6",
         "owlready2",
         "python-Levenshtein",
         "pyyaml",
+        "rapidfuzz==2.13.7",
         "rdflib==5.0.0",
         "regex",
         "requests==2.28.1",
+        "scipy==1.7.3",
         "spacy==2.2.3",
         "spacy-langdetect==0.1.2",
         "spelchek",
@@ -1,14 +1,213 @@
 #!/usr/bin/env python3
 """abox matcher within PrOM"""
 
-import itertools as it
+import multiprocessing as mp
 import numpy as np
+import random
+from collections import Counter, defaultdict
 import yaml
 from owlready2 import World, IRIS, onto_path, owl, Property, entity
+from scipy.sparse import csr_matrix
 
 import alignment_selector as alse
+import lsh_blocker as lsh
+import onto_registry as reg
 import string_matcher as stma
 
+# number of individual pairs for which structural similarity is computed at once
+TILE_SIZE = 65536
+
+
+def encode_value_lists(value_lists_1: list, value_lists_2: list) -> tuple:
+    """ encode the values of a datatype property for two sets of individuals; every value
+    list is hashed to the id of its multiset of values and represented as a binary row of an
+    incidence matrix over all distinct values
+
+    :param value_lists_x: value list per individual
+    :return: multiset ids, value set sizes, and incidence matrices for both sets of individuals
+    """
+    multisets: dict = {}
+    values: dict = {}
+    encodings: list = []
+    for value_lists in (value_lists_1, value_lists_2):
+        ids = np.array([multisets.setdefault(frozenset(Counter(vals).items()), len(multisets))
+                        for vals in value_lists], dtype=np.int64)
+        rows: list = []
+        cols: list = []
+        for row, vals in enumerate(value_lists):
+            for val in set(vals):
+                rows.append(row)
+                cols.append(values.setdefault(val, len(values)))
+        encodings.append((ids, rows, cols))
+    encoded: list = []
+    for ids, rows, cols in encodings:
+        incidence = csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(len(ids), len(values)))
+        encoded.extend((ids, np.asarray(incidence.sum(axis=1)).ravel(), incidence))
+    return tuple(encoded)
+
+
+def binary_cos_sim_matrix(encodings: list, rows: slice, shape: tuple, op_threshold: float) -> np.ndarray:
+    """ cosine similarity of binary representations of datatype property values for all
+    combinations of individuals, cp. encode_value_lists; value sets are rated w 1 if they
+    are equal, w .5 if one subsumes the other, and w 0 otherwise; only value sets w at
+    least one element are compared, if both are empty no conclusions can be drawn due to OWA
+    NOTE: if the number of compared properties is below op_threshold the similarity is 0
+
+    :param encodings: encoded values of both sets of individuals per datatype property
+    :param rows: individuals of the first set to be compared
+    :param shape: shape of the resulting similarity matrix
+    :param op_threshold: minimum number of properties for assessing the similarity
+    :return: similarity matrix
+    """
+    compared = np.zeros(shape)
+    rating_sum = np.zeros(shape)
+    rating_sq_sum = np.zeros(shape)
+    for ids_1, sizes_1, incidence_1, ids_2, sizes_2, incidence_2 in encodings:
+        overlap = (incidence_1[rows] @ incidence_2.T).toarray()
+        sizes_a = sizes_1[rows, None]
+        sizes_b = sizes_2[None, :]
+        subsumed = (overlap == sizes_a) | (overlap == sizes_b)
+        rating = np.where(ids_1[rows, None] == ids_2[None, :], 1., np.where(subsumed, .5, 0.))
+        rating *= (sizes_a > 0) | (sizes_b > 0)
+        compared += (sizes_a > 0) | (sizes_b > 0)
+        rating_sum += rating
+        rating_sq_sum += rating ** 2
+    return np.divide(rating_sum, np.sqrt(compared * rating_sq_sum), out=np.zeros(shape),
+                     where=(compared >= op_threshold) & (rating_sq_sum > 0))
+
+
+def rel_sim_matrix(counts_1: np.ndarray, counts_2: np.ndarray, op_threshold: float) -> np.ndarray:
+    """ cosine similarity of object property counts for all combinations of individuals;
+    only properties used by at least one of the two individuals are compared
+    NOTE: if the number of compared properties is below op_threshold the similarity is 0
+
+    :param counts_x: matrix w object property counts per individual
+    :param op_threshold: minimum number of properties for assessing the similarity
+    :return: similarity matrix
+    """
+    used_1 = (counts_1 > 0).astype(np.int64)
+    used_2 = (counts_2 > 0).astype(np.int64)
+    compared = used_1.sum(axis=1)[:, None] + used_2.sum(axis=1)[None, :] - used_1 @ used_2.T
+    dot_product = (counts_1 @ counts_2.T).astype(np.float64)
+    # NOTE: the norms are multiplied before taking the root so that identical vectors result in exactly 1
+    norms = np.sqrt(np.outer((counts_1 ** 2).sum(axis=1), (counts_2 ** 2).sum(axis=1)).astype(np.float64))
+    return np.divide(dot_product, norms, out=np.zeros(dot_product.shape),
+                     where=(compared >= op_threshold) & (norms > 0))
+
+
+def calc_structure_ratings(features_1: list, features_2: list, weights: tuple, op_threshold: float,
+                           tile_size: int = TILE_SIZE):
+    """ calculate the structural similarity for all combinations of individuals from two
+    lists; tiles of the rating matrix are computed one after another to limit memory consumption
+
+    :param features_x: property vectors per individual, i.e., dicts w keys dpv, opvo, and opvi
+    :param weights: weightings for datatype properties, outgoing and incoming object properties
+    :param op_threshold: minimum number of properties for assessing the similarity
+    :param tile_size: approximate number of individual pairs per tile
+    :return: generator of tuples w the first individuals' indices as range and the rating matrix tile
+    """
+    if not features_1 or not features_2:
+        return
+    dp_weight, opo_weight, opi_weight = weights
+    encodings = [encode_value_lists([f["dpv"][dp] for f in features_1], [f["dpv"][dp] for f in features_2])
+                 for dp in range(len(features_1[0]["dpv"]))]
+    counts = {key: [np.array([f[key] for f in features], dtype=np.int64).reshape(len(features), -1)
+                    for features in (features_1, features_2)] for key in ("opvo", "opvi")}
+    step = max(1, tile_size // max(1, len(features_2)))
+    for start in range(0, len(features_1), step):
+        rows = slice(start, start + step)
+        tile_rows = range(*rows.indices(len(features_1)))
+        dpr = binary_cos_sim_matrix(encodings, rows, (len(tile_rows), len(features_2)), op_threshold)
+        opor = rel_sim_matrix(counts["opvo"][0][rows], counts["opvo"][1], op_threshold)
+        opir = rel_sim_matrix(counts["opvi"][0][rows], counts["opvi"][1], op_threshold)
+        yield tile_rows, dp_weight * dpr + opo_weight * opor + opi_weight * opir
+
+
+def calc_structure_pair_ratings(features_1: list, features_2: list, pairs: list, weights: tuple,
+                                op_threshold: float, tile_size: int = TILE_SIZE) -> np.ndarray:
+    """ calculate the structural similarity for given combinations of individuals from two
+    lists, e.g., candidates from blocking; cp. calc_structure_ratings for the ratings
+
+    :param features_x: property vectors per individual, i.e., dicts w keys dpv, opvo, and opvi
+    :param pairs: combinations as tuples of positions in features_1 and features_2
+    :param weights: weightings for datatype properties, outgoing and incoming object properties
+    :param op_threshold: minimum number of properties for assessing the similarity
+    :param tile_size: number of pairs rated at once
+    :return: array of ratings in the order of the pairs
+    """
+    ratings = np.zeros(len(pairs))
+    if not pairs:
+        return ratings
+    dp_weight, opo_weight, opi_weight = weights
+    encodings = [encode_value_lists([f["dpv"][dp] for f in features_1], [f["dpv"][dp] for f in features_2])
+                 for dp in range(len(features_1[0]["dpv"]))]
+    counts = {key: [np.array([f[key] for f in features], dtype=np.int64).reshape(len(features), -1)
+                    for features in (features_1, features_2)] for key in ("opvo", "opvi")}
+    positions = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    for start in range(0, len(pairs), tile_size):
+        rows = positions[start:start + tile_size, 0]
+        cols = positions[start:start + tile_size, 1]
+        compared = np.zeros(len(rows))
+        rating_sum = np.zeros(len(rows))
+        rating_sq_sum = np.zeros(len(rows))
+        for ids_1, sizes_1, incidence_1, ids_2, sizes_2, incidence_2 in encodings:
+            overlap = np.asarray(incidence_1[rows].multiply(incidence_2[cols]).sum(axis=1)).ravel()
+            subsumed = (overlap == sizes_1[rows]) | (overlap == sizes_2[cols])
+            rating = np.where(ids_1[rows] == ids_2[cols], 1., np.where(subsumed, .5, 0.))
+            rating *= (sizes_1[rows] > 0) | (sizes_2[cols] > 0)
+            compared += (sizes_1[rows] > 0) | (sizes_2[cols] > 0)
+            rating_sum += rating
+            rating_sq_sum += rating ** 2
+        dpr = np.divide(rating_sum, np.sqrt(compared * rating_sq_sum), out=np.zeros(len(rows)),
+                        where=(compared >= op_threshold) & (rating_sq_sum > 0))
+        op_ratings = []
+        for key in "opvo", "opvi":
+            counts_a = counts[key][0][rows]
+            counts_b = counts[key][1][cols]
+            op_compared = ((counts_a > 0) | (counts_b > 0)).sum(axis=1)
+            norms = np.sqrt(((counts_a ** 2).sum(axis=1) * (counts_b ** 2).sum(axis=1)).astype(np.float64))
+            op_ratings.append(np.divide((counts_a * counts_b).sum(axis=1).astype(np.float64), norms,
+                                        out=np.zeros(len(rows)), where=(op_compared >= op_threshold) & (norms > 0)))
+        ratings[start:start + tile_size] = dp_weight * dpr + opo_weight * op_ratings[0] + opi_weight * op_ratings[1]
+    return ratings
+
+
+def rate_structure(features_1: list, features_2: list, weights: tuple, op_threshold: float,
+                   pairs: list = None) -> np.ndarray:
+    """ calculate the structural similarity matrix for two lists of individuals,
+    cp. calc_structure_ratings; suitable as job for a process pool
+
+    :param features_x: property vectors per individual
+    :param weights: weightings for datatype properties, outgoing and incoming object properties
+    :param op_threshold: minimum number of properties for assessing the similarity
+    :param pairs: only rate these combinations of positions, cp. calc_structure_pair_ratings
+    :return: rating matrix w the first individuals as rows, array of ratings per pair if pairs are given
+    """
+    if pairs is not None:
+        return calc_structure_pair_ratings(features_1, features_2, pairs, weights, op_threshold)
+    tiles = [tile for _, tile in calc_structure_ratings(features_1, features_2, weights, op_threshold)]
+    return np.vstack(tiles) if tiles else np.zeros((len(features_1), len(features_2)))
+
+
+def match_names(names_1: list, names_2: list, threshold: float, backend: str, pairs: list = None,
+                threads: int = -1) -> list:
+    """ calculate string similarity for all combinations of names from two lists;
+    suitable as job for a process pool
+
+    :param names_x: names of the individuals
+    :param threshold: threshold for the string matcher
+    :param backend: backend of the string matcher
+    :param pairs: only rate these combinations of positions
+    :param threads: number of threads used by the rapidfuzz backend, -1 uses all cores
+    :return: list of rated matches (pos1, pos2, rating) w the positions in the input lists
+    """
+    matcher = stma.StringMatcher(list(enumerate(names_1)), list(enumerate(names_2)), -1, -1, threshold)
+    if pairs is None:
+        matcher.match_lists(backend=backend, workers=threads)
+    else:
+        matcher.match_pairs(pairs, backend=backend)
+    return [(m[0][0], m[1][0], m[2]) for m in matcher.matches]
+
 
 class AboxMatcher:
     """load and match ABoxes of two ontos"""
@@ -27,10 +226,12 @@ class AboxMatcher:
         self.path1 = path1
         self.path2 = path2
         self.tbox_al = tbox_al
-        self.onto1_world = World()
-        self.onto2_world = World()
-        self.onto1 = self.onto1_world.get_ontology(self.path1).load()
-        self.onto2 = self.onto2_world.get_ontology(self.path2).load()
+        loaded1 = reg.REGISTRY.get(self.path1)
+        loaded2 = reg.REGISTRY.get(self.path2)
+        self.onto1_world = loaded1.world
+        self.onto2_world = loaded2.world
+        self.onto1 = loaded1.onto
+        self.onto2 = loaded2.onto
         paths = [path.rsplit("/", maxsplit=1)[0]+"/" for path in (path1, path2)]
         onto_path.extend(list(dict.fromkeys(paths)))
 
@@ -39,6 +240,13 @@ class AboxMatcher:
             self.str_threshold = cfg["abox"]["string-threshold"]
             self.overall_threshold = cfg["abox"]["overall-threshold"]
             self.algtype = cfg["abox"]["algtype"]
+            self.string_backend = cfg["abox"]["string-backend"]
+            self.workers = cfg["abox"]["workers"]
+            self.lsh_enabled = cfg["abox"]["lsh"]["enabled"]
+            self.lsh_bands = cfg["abox"]["lsh"]["bands"]
+            self.lsh_rows = cfg["abox"]["lsh"]["rows"]
+            self.shingle_size = cfg["abox"]["lsh"]["shingle-size"]
+            self.lsh_sample_size = cfg["abox"]["lsh"]["sample-size"]
             self.label_rating = cfg["abox"]["weighting"]["label"]
             self.structure_rating = cfg["abox"]["weighting"]["structure"]
             self.dp_rating = cfg["abox"]["weighting"]["structure-sub"]["dp"]
@@ -46,7 +254,7 @@ class AboxMatcher:
             self.opi_rating = cfg["abox"]["weighting"]["structure-sub"]["op-incoming"]
             self.op_threshold = cfg["abox"]["weighting"]["structure-sub"]["op-threshold"]
 
-    def compare_inds_by_structure(self, unbiased: bool=False) -> list:
+    def compare_inds_by_structure(self, unbiased: bool=False, candidates: list = None) -> list:
         """ compare individuals by structure; compare values associated via
         datatype properties and both incoming and outgoing object properties;
         greedy selection sensible as individuals are unambiguously linked to a
@@ -54,6 +262,7 @@ class AboxMatcher:
 
         :param unbiased: do not use information about class similarity from tbox
             matching, i.e., ignore self.tbox_al
+        :param candidates: if unbiased, only compare these pairs of individuals, cp. block_individuals
         :return: assessment of structural similarity of individuals [(ind1,ind2,rating)]
         """
         # set up object property value and data property value
@@ -64,133 +273,140 @@ class AboxMatcher:
 
         def _populate_dpvi(world: World, ind: owl.Thing, dpv: list) -> list:
             """ populate vector representing datatype properties with lists of values
+            NOTE: values are copied to plain lists that can be passed to worker processes
             """
-            return [_get_property_list(world, ind, dp) for dp in dpv]
+            return [list(self._get_property_list(world, ind, dp)) for dp in dpv]
+
+        def _index_object_properties(world: World, opv: list) -> tuple:
+            """ scan the assertions of all aligned object properties once and count the
+            related individuals per property for both subjects and objects
+            NOTE: assertions of inverse properties are included w subject and object
+            swapped, as for attribute access and world.search in owlready2
 
-        def _populate_outgoing_opvi(world: World, ind: owl.Thing, opv: list) -> list:
+            :param world: world the properties are defined in
+            :param opv: IRIs of the aligned object properties
+            :return: tables subject -> {property IRI: count} and object -> {property IRI: count}
+            """
+            outgoing: dict = defaultdict(dict)
+            incoming: dict = defaultdict(dict)
+            for op in dict.fromkeys(opv):
+                prop = world[op]
+                relations = set(prop.get_relations())
+                if prop.inverse_property:
+                    relations.update((obj, subj) for subj, obj in prop.inverse_property.get_relations())
+                for subj, obj in relations:
+                    outgoing[subj][op] = outgoing[subj].get(op, 0) + 1
+                    incoming[obj][op] = incoming[obj].get(op, 0) + 1
+            return outgoing, incoming
+
+        opindex1 = _index_object_properties(self.onto1_world, opv1)
+        opindex2 = _index_object_properties(self.onto2_world, opv2)
+
+        def _populate_outgoing_opvi(opindex: tuple, ind: owl.Thing, opv: list) -> list:
             """ populate vector with outgoing object porperties - count occurrences only,
             object is not considered
             """
-            return [len(_get_property_list(world, ind, op)) for op in opv]
+            counts = opindex[0].get(ind, {})
+            return [counts.get(op, 0) for op in opv]
 
-        def _populate_incoming_opvi(world: World, ind: owl.Thing, opv: list) -> list:
+        def _populate_incoming_opvi(opindex: tuple, ind: owl.Thing, opv: list) -> list:
             """ populate vector with incoming object porperties - count occurrences only,
             object is not considered
             """
-            # NOTE: for further details cp. owlready2/namespace.py/search
-            return [len(world.search(**{myop.name: ind})) for myop in (world[op] for op in opv)]
+            counts = opindex[1].get(ind, {})
+            return [counts.get(op, 0) for op in opv]
 
-        def _get_property_list(world: World, ind: owl.Thing, prop: Property) -> list:
-            """ get list of objects for a given combination of an individual and
-            a property - can be an ObjectProperty or a DatatypeProperty
-            this is necessary, as Owlready2 may return None, a single object, or a list
-            """
-            objs = getattr(ind, world[prop].name)
-            if isinstance(objs, list):
-                objs_list = objs
-            elif objs is None:
-                objs_list = []
-            else:
-                objs_list = [objs]
-            return objs_list
-
-        def _rel_sim(vec_a: list, vec_b: list) -> float:
-            assert len(vec_a) == len(vec_b), "input vectors are of different lengths"
-            combis = list(zip(vec_a, vec_b))
-            vec_a_r = [combi[0] for combi in combis if combi[0] or combi[1]]
-            vec_b_r = [combi[1] for combi in combis if combi[0] or combi[1]]
-            return _cos_sim(vec_a_r, vec_b_r)
-
-        def _binary_cos_sim(vec_a: list, vec_b: list) -> float:
-            """ cosine similarity, but vectors are reduced to binary representation.
-            i.e., a match can either be present (both vector entries set to 0) or
-            not present (second sector entry set to 1)
-            only compares values if at least one vector includes an element, if
-            list is empty, no conclusions can be drawn due to OWA
-            NOTE: for non-functional data props, we rate value sets between which
-            a subsumption relation holds with .5 - this is only reflected in the cosine
-            similarity if not all value sets subsume each other (due to normalization)
-
-            :param vec_a: first input vector
-            :param vec_b: second input vector
-            :return: cosine similarity for simplified vectors
-            """
-            binv_a = [1 for c, val in enumerate(vec_a) if val or vec_b[c]]
-            binv_b = [1 if sorted(val) == sorted(vec_a[c])
-                      else .5 if all(e in vec_a[c] for e in val) or all(e in val for e in vec_a[c])
-                      else 0 for c, val in enumerate(vec_b) if val or vec_a[c]]
-            return _cos_sim(binv_a, binv_b)
-
-        def _cos_sim(vec_a: list, vec_b: list) -> float:
-            """ calculate cosine similarity for two vectors
-            NOTE: if number of available properties is below op-threshold (set via
-            config) then the cosine similarity cannot be assessed and is set to 0
-
-            :param vec_a: first vector
-            :param vec_b: second vector
-            :return: cosine similarity for the two input vectors
-            """
-            assert len(vec_a) == len(vec_b), "issue with vector lengths"
-            dot_product = np.dot(vec_a, vec_b)
-            norm_a = np.linalg.norm(vec_a)
-            norm_b = np.linalg.norm(vec_b)
-            cos_sim = None
-            if len(vec_a) < self.op_threshold or norm_a == 0.0 or norm_b == 0.0:
-                cos_sim = 0.0
-            elif isinstance(vec_a, np.ndarray) and isinstance(vec_b, np.ndarray):
-                comparison = vec_a == vec_b
-                if comparison.all():
-                    cos_sim = 1.0
-            elif isinstance(vec_a, list) and isinstance(vec_b, list) and vec_a == vec_b:
-                cos_sim = 1.0
-            elif norm_a != 0.0 and norm_b != 0.0:
-                cos_sim = dot_product / (norm_a * norm_b)
-            return cos_sim
-
-        def _create_prop_vec_dict(world: World, individuals: list, dpv: list, opv: list) -> dict:
-            pvdict = {}
+        # NOTE: property vectors only depend on the individual and are reused across class matches
+        prop_vecs1: dict = {}
+        prop_vecs2: dict = {}
+
+        def _create_prop_vec_dict(world: World, opindex: tuple, individuals: list, dpv: list, opv: list,
+                                  pvdict: dict) -> dict:
             for ind in individuals:
+                if ind in pvdict:
+                    continue
                 pvdict[ind] = {
                     "dpv": _populate_dpvi(world, ind, dpv),
-                    "opvo": _populate_outgoing_opvi(world, ind, opv),
-                    "opvi": _populate_incoming_opvi(world, ind, opv)
+                    "opvo": _populate_outgoing_opvi(opindex, ind, opv),
+                    "opvi": _populate_incoming_opvi(opindex, ind, opv)
                 }
             return pvdict
 
-        def _calc_ratings_for_ind_sets(inds1: list, inds2: list) -> list:
-            """ calculate pairwise similirity for all combinations of individuals
-            from the two input lists
+        def _create_job(inds1: list, inds2: list) -> tuple:
+            """ create job for calculating the pairwise similarity for all combinations of
+            individuals from the two input lists, cp. rate_structure
 
             :param inds1: first list of individuals to be compared
             :param inds2: second list of individuals to be compared
-            :return: pairwise similarity ratings for the individuals
+            :return: arguments for rate_structure
             """
-            mydict1 = _create_prop_vec_dict(self.onto1_world, inds1, dpv1, opv1)
-            mydict2 = _create_prop_vec_dict(self.onto2_world, inds2, dpv2, opv2)
-            ratings: list = []
-            for combi in it.product(inds1, inds2):
-                dpr = _binary_cos_sim(mydict1[combi[0]]["dpv"], mydict2[combi[1]]["dpv"])
-                opor = _rel_sim(mydict1[combi[0]]["opvo"], mydict2[combi[1]]["opvo"])
-                opir = _rel_sim(mydict1[combi[0]]["opvi"], mydict2[combi[1]]["opvi"])
-                rating = self.dp_rating * dpr + self.opo_rating * opor + self.opi_rating * opir
-                ratings.append(([combi[0], combi[0].name], [combi[1], combi[1].name], rating))
-            return ratings
+            mydict1 = _create_prop_vec_dict(self.onto1_world, opindex1, inds1, dpv1, opv1, prop_vecs1)
+            mydict2 = _create_prop_vec_dict(self.onto2_world, opindex2, inds2, dpv2, opv2, prop_vecs2)
+            weights = (self.dp_rating, self.opo_rating, self.opi_rating)
+            return [mydict1[i] for i in inds1], [mydict2[i] for i in inds2], weights, self.op_threshold
 
+        ind_sets = self._get_ind_sets(unbiased)
         all_ratings: list = []
-        if unbiased:
-            individuals1 = list(self.onto1.individuals())
-            individuals2 = list(self.onto2.individuals())
-            all_ratings = _calc_ratings_for_ind_sets(individuals1, individuals2)
-        else:
-            for match in self.tbox_al:
-                # NOTE: to reduce space complexity, it may make sense to check thresholds right away
-                if match[0] == "owl:Class" and match[3] in self.relations:
-                    # get individuals that are not instances of subclasses that also appear in the tbox alignment
-                    individuals1 = self._get_inds_unique_to_class(self.onto1_world[match[1]], 1)
-                    individuals2 = self._get_inds_unique_to_class(self.onto2_world[match[2]], 2)
-                    all_ratings.extend(_calc_ratings_for_ind_sets(individuals1, individuals2))
+        if unbiased and candidates is not None:
+            inds1, inds2 = ind_sets[0]
+            ratings = rate_structure(*_create_job(inds1, inds2), pairs=candidates)
+            all_ratings.extend(([inds1[pos1], inds1[pos1].name], [inds2[pos2], inds2[pos2].name], rating)
+                               for (pos1, pos2), rating in zip(candidates, ratings.tolist()))
+            return all_ratings
+        results = self._run_jobs(rate_structure, [_create_job(inds1, inds2) for inds1, inds2 in ind_sets])
+        for (inds1, inds2), ratings in zip(ind_sets, results):
+            # NOTE: to reduce space complexity, it may make sense to check thresholds right away
+            for ind1, row in zip(inds1, ratings.tolist()):
+                all_ratings.extend(([ind1, ind1.name], [ind2, ind2.name], rating) for ind2, rating in zip(inds2, row))
         return all_ratings
 
+    @staticmethod
+    def _get_property_list(world: World, ind: owl.Thing, prop: Property) -> list:
+        """ get list of objects for a given combination of an individual and
+        a property - can be an ObjectProperty or a DatatypeProperty
+        this is necessary, as Owlready2 may return None, a single object, or a list
+        """
+        objs = getattr(ind, world[prop].name)
+        if isinstance(objs, list):
+            objs_list = objs
+        elif objs is None:
+            objs_list = []
+        else:
+            objs_list = [objs]
+        return objs_list
+
+    def _get_ind_sets(self, unbiased: bool) -> list:
+        """ get the sets of individuals to be compared, i.e., all individuals if unbiased,
+        otherwise the individuals of each pair of classes matched during tbox matching
+
+        :param unbiased: do not use information about class similarity from tbox
+            matching, i.e., ignore self.tbox_al
+        :return: list of tuples w the individuals from both ontos
+        """
+        if unbiased:
+            return [(list(self.onto1.individuals()), list(self.onto2.individuals()))]
+        ind_sets = []
+        for match in self.tbox_al:
+            if match[0] == "owl:Class" and match[3] in self.relations:
+                # get individuals that are not instances of subclasses that also appear in the tbox alignment
+                individuals1 = self._get_inds_unique_to_class(self.onto1_world[match[1]], 1)
+                individuals2 = self._get_inds_unique_to_class(self.onto2_world[match[2]], 2)
+                ind_sets.append((individuals1, individuals2))
+        return ind_sets
+
+    def _run_jobs(self, func, jobs: list) -> list:
+        """ run independent jobs, e.g., per pair of matched classes, in a process pool
+        if several workers are configured; jobs must not include owlready2 objects
+
+        :param func: module level function to be called for each job
+        :param jobs: list of argument tuples
+        :return: list of results in the order of the jobs
+        """
+        if self.workers > 1 and len(jobs) > 1:
+            with mp.Pool(processes=min(self.workers, len(jobs))) as pool:
+                return pool.starmap(func, jobs)
+        return [func(*job) for job in jobs]
+
     def _get_inds_unique_to_class(self, cls: entity.ThingClass, index: int) -> list:
         """ get individuals that are instances of a certain class, but are not instances of sublasses of class,
         which also appear in the tbox alignment
@@ -200,13 +416,9 @@ class AboxMatcher:
             relevant for link to tbox alignment
         :return: list of individuals unique to class
         """
-        individuals = list(cls.instances())
-        al_classes = [al[index] for al in self.tbox_al]
-        for sub in cls.subclasses():
-            if sub.iri in al_classes:
-                for ind in sub.instances():
-                    individuals.remove(ind)
-        return individuals
+        al_classes = {al[index] for al in self.tbox_al}
+        excluded = {ind for sub in cls.subclasses() if sub.iri in al_classes for ind in sub.instances()}
+        return [ind for ind in cls.instances() if ind not in excluded]
 
     def _combine_ratings(self, lst1: list, lst2: list, weighting1: float = .5, weighting2: float = .5) -> list:
         """ combine ratings from two individual comparisons
@@ -217,45 +429,54 @@ class AboxMatcher:
         :param weighting2: weighting for results of second prior comparison
         :return: combined ratings for string sim and structure
         """
-        double_rating = [(e1[0], e1[1], weighting1*e1[2]+weighting2*e2[2]) for e1 in lst1 for e2 in lst2 if
-                         e1[0] == e2[0] and e1[1] == e2[1]]
-        double_rating_pairs = [(e[0], e[1]) for e in double_rating]
-        single_rating_1 = [(e[0], e[1], weighting1*e[2]) for e in lst1 if not (e[0], e[1]) in double_rating_pairs]
-        single_rating_2 = [(e[0], e[1], weighting2*e[2]) for e in lst2 if not (e[0], e[1]) in double_rating_pairs]
+        # NOTE: ratings are joined via their pairs of individuals, the order of the nested comparison is retained
+        ratings_2 = defaultdict(list)
+        for e2 in lst2:
+            ratings_2[self._pair_key(e2)].append(e2)
+        pairs_1 = set()
+        double_rating = []
+        single_rating_1 = []
+        for e1 in lst1:
+            key = self._pair_key(e1)
+            pairs_1.add(key)
+            if key in ratings_2:
+                double_rating.extend((e1[0], e1[1], weighting1*e1[2]+weighting2*e2[2]) for e2 in ratings_2[key])
+            else:
+                single_rating_1.append((e1[0], e1[1], weighting1*e1[2]))
+        single_rating_2 = [(e[0], e[1], weighting2*e[2]) for e in lst2 if self._pair_key(e) not in pairs_1]
         matches = double_rating + single_rating_1 + single_rating_2
         selector = alse.AlignmentSelector(self.overall_threshold, matches, 0, 1, -1)
         selector.optimize_combination("greedy")
         return selector.optimal_combination
 
-    def compare_inds_by_name(self, unbiased: bool = False) -> list:
+    @staticmethod
+    def _pair_key(match: tuple) -> tuple:
+        """ hashable key for the pair of individuals in a match, individuals may be given as [individual, name]
+
+        :param match: rated match (ind1, ind2, rating)
+        :return: tuple of hashable representations of both individuals
+        """
+        return tuple(tuple(e) if isinstance(e, list) else e for e in match[:2])
+
+    def compare_inds_by_name(self, unbiased: bool = False, candidates: list = None) -> list:
         """ leverage TBox alignment for matching individuals
 
         :param unbiased: do not use information about class similarity from tbox
             matching, i.e., ignore self.tbox_al
+        :param candidates: if unbiased, only compare these pairs of individuals, cp. block_individuals
         :return: list of matched individuals
         """
-        def _string_matcher(inds1: list, inds2: list) -> list:
-            """ compare names using string similarity
-            """
-            matcher = stma.StringMatcher(inds1, inds2, -1, -1, self.str_threshold)
-            matcher.match_lists()
-            return matcher.matches
-
+        ind_sets = self._get_ind_sets(unbiased)
+        # get names of individuals
+        ind_sets = [([[i, i.name] for i in inds1], [[i, i.name] for i in inds2]) for inds1, inds2 in ind_sets]
+        pairs = candidates if unbiased else None
+        # NOTE: jobs in the process pool use a single thread each to avoid oversubscribing the cores
+        threads = 1 if self.workers > 1 and len(ind_sets) > 1 else -1
+        jobs = [([i[1] for i in inds1], [i[1] for i in inds2], self.str_threshold, self.string_backend, pairs, threads)
+                for inds1, inds2 in ind_sets]
         str_matches = []
-        if unbiased:
-            individuals1 = [[i, i.name] for i in self.onto1.individuals()]
-            individuals2 = [[i, i.name] for i in self.onto2.individuals()]
-            str_matches = _string_matcher(individuals1, individuals2)
-        else:
-            for match in self.tbox_al:
-                if match[0] == "owl:Class" and match[3] in self.relations:
-                    # get individuals that are not instances of subclasses that also appear in the tbox alignment
-                    individuals1 = self._get_inds_unique_to_class(self.onto1_world[match[1]], 1)
-                    individuals2 = self._get_inds_unique_to_class(self.onto2_world[match[2]], 2)
-                    # get names of individuals
-                    individuals1 = [[i, i.name] for i in individuals1]
-                    individuals2 = [[i, i.name] for i in individuals2]
-                    str_matches.extend(_string_matcher(individuals1, individuals2))
+        for (inds1, inds2), matches in zip(ind_sets, self._run_jobs(match_names, jobs)):
+            str_matches.extend((inds1[pos1], inds2[pos2], rating) for pos1, pos2, rating in matches)
         return str_matches
 
     def compare_inds(self, unbiased: bool = False) -> list:
@@ -265,11 +486,69 @@ class AboxMatcher:
             individuals of classes matched during tbox matching
         :return: tuple with selected rated matches (ind1, ind2, rating)
         """
-        string_matches = self.compare_inds_by_name(unbiased)
-        structure_matches = self.compare_inds_by_structure(unbiased)
+        candidates = None
+        if unbiased and self.lsh_enabled:
+            candidates = self.block_individuals()
+            # NOTE: the recall report compares the sample exhaustively, it is opt-in via sample-size
+            if self.lsh_sample_size:
+                recall = self.lsh_recall(candidates, self.lsh_sample_size)
+                print(f"LSH blocking: {len(candidates)} candidate pairs, recall on sample: {recall}")
+        string_matches = self.compare_inds_by_name(unbiased, candidates)
+        structure_matches = self.compare_inds_by_structure(unbiased, candidates)
         matches = self._combine_ratings(string_matches, structure_matches, self.label_rating, self.structure_rating)
         return matches
 
+    def block_individuals(self) -> list:
+        """ find candidate pairs for unbiased matching via LSH, cp. lsh_blocker; individuals
+        are hashed by character shingles of their names and, separately, by the values of
+        aligned datatype properties; pairs that collide for either are candidates
+
+        :return: sorted candidate pairs as tuples of positions in the lists of all individuals
+        """
+        inds1, inds2 = self._get_ind_sets(True)[0]
+        dpv1 = [m[1] for m in self.tbox_al if m[0]=="owl:DatatypeProperty"]
+        dpv2 = [m[2] for m in self.tbox_al if m[0]=="owl:DatatypeProperty"]
+        blocker = lsh.LshBlocker(self.lsh_bands, self.lsh_rows)
+        candidates = blocker.candidate_pairs([blocker.shingles(i.name, self.shingle_size) for i in inds1],
+                                             [blocker.shingles(i.name, self.shingle_size) for i in inds2])
+        candidates.update(blocker.candidate_pairs([self._get_value_tokens(self.onto1_world, i, dpv1) for i in inds1],
+                                                  [self._get_value_tokens(self.onto2_world, i, dpv2) for i in inds2]))
+        return sorted(candidates)
+
+    @classmethod
+    def _get_value_tokens(cls, world: World, ind: owl.Thing, dpv: list) -> set:
+        """ represent the values of aligned datatype properties as tokens, the position of
+        the property in the alignment is used as common identifier for both ontos
+
+        :param world: world the properties are defined in
+        :param ind: individual
+        :param dpv: IRIs of the aligned datatype properties
+        :return: set of tokens of the form position=value
+        """
+        return {f"{pos}={val}" for pos, dp in enumerate(dpv) for val in cls._get_property_list(world, ind, dp)}
+
+    def lsh_recall(self, candidates: list, sample_size: int, seed: int = 0) -> float:
+        """ compare candidates from blocking w the matches selected after an exhaustive
+        comparison of a sample of individuals from the first onto w all individuals from the second one
+
+        :param candidates: candidate pairs, cp. block_individuals
+        :param sample_size: number of individuals from the first onto
+        :param seed: seed for drawing the sample
+        :return: share of exhaustively found matches that are also candidates, None if there are no matches
+        """
+        inds1, inds2 = self._get_ind_sets(True)[0]
+        sample = sorted(random.Random(seed).sample(range(len(inds1)), min(sample_size, len(inds1))))
+        exhaustive = [(pos1, pos2) for pos1 in sample for pos2 in range(len(inds2))]
+        matches = self._combine_ratings(self.compare_inds_by_name(True, exhaustive),
+                                        self.compare_inds_by_structure(True, exhaustive),
+                                        self.label_rating, self.structure_rating)
+        if not matches:
+            return None
+        positions1 = {ind: pos for pos, ind in enumerate(inds1)}
+        positions2 = {ind: pos for pos, ind in enumerate(inds2)}
+        found = {(positions1[m[0][0]], positions2[m[1][0]]) for m in matches}
+        return len(found.intersection(candidates)) / len(found)
+
 
 if __name__ == "__main__":
     tbox_alignment = [["owl:Class", "http://example.org/onto-a.owl#merhcandise",
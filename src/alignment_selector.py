@@ -4,16 +4,26 @@ alignment selection
 """
 
 import copy
+import heapq
 import itertools as it
 import multiprocessing as mp
+import numpy as np
 import timeit
 
+from collections import defaultdict
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import issparse
+from typing import Callable, Iterable
+
 
 class AlignmentSelector:
     """optimize the alignment for a set of matches"""
 
+    # NOTE: minimum number of matches in a component for solving it in a separate process
+    _pool_min_size: int = 8
+
     def __init__(self, threshold: float, matches: list, uid1_pos: int,
-                 uid2_pos: int, rating_pos: int = -1) -> None:
+                 uid2_pos: int, rating_pos: int = -1, tie_break: Callable = None) -> None:
         """ init
 
         :param threshold: acceptance threshold for similarity
@@ -21,6 +31,9 @@ class AlignmentSelector:
         :param uid1_pos: position of the first element's name in the match
         :param uid2_pos: position of the second element's name in the match
         :param rating_pos: position of the rating in the match, default is last slot
+        :param tie_break: key function for ordering matches w the same rating in
+            greedy selection, e.g., lambda m: (str(m[uid1_pos]), str(m[uid2_pos]));
+            input order is used if None
         """
         self.threshold: float = threshold
         self.matches: list = matches
@@ -28,6 +41,7 @@ class AlignmentSelector:
         self.uid1_pos: int = uid1_pos
         self.uid2_pos: int = uid2_pos
         self.rating_pos: int = rating_pos
+        self.tie_break: Callable = tie_break
 
     def optimize_combination(self, method: str) -> None:
         """ calculate similarity for all combinations of elements from two lists
@@ -38,7 +52,8 @@ class AlignmentSelector:
         methods = {"greedy": self._greedy_selection,
                    "greedy_depr": self._greedy_selection_deprecated,
                    "optimal_sc": self._optimal_selection,
-                   "optimal_mc": self._optimal_selection_multicore}
+                   "optimal_mc": self._optimal_selection_multicore,
+                   "optimal_lsa": self._optimal_lsa_selection}
         reduced_combinations = self._enforce_threshold(self.matches)
         try:
             selection = methods[method]
@@ -46,6 +61,41 @@ class AlignmentSelector:
         except KeyError:
             print(f"invalid method {method} - should be one of {list(methods.keys())}")
 
+    def optimize_matrix(self, scores: np.ndarray, method: str) -> list:
+        """ select matches from a similarity matrix w the first elements as rows and the
+        second elements as columns; the threshold is enforced on the matrix directly
+
+        :param scores: similarity matrix, dense or as scipy sparse matrix w the omitted entries
+            below the threshold
+        :param method: selection method, cp. optimize_combination
+        :return: list of selected (row, column, rating) tuples
+        """
+        if issparse(scores):
+            # NOTE: canonical csr format, i.e., sorted indices, retains row-major order
+            scores = scores.tocsr()
+            scores.sum_duplicates()
+            scores = scores.tocoo()
+            mask = scores.data > self.threshold
+            rows, cols, ratings = scores.row[mask], scores.col[mask], scores.data[mask]
+        else:
+            rows, cols = np.nonzero(scores > self.threshold)
+            ratings = scores[rows, cols]
+        if method == "greedy" and not self.tie_break:
+            # NOTE: stable sort retains row-major order for ties as in _greedy_selection
+            selection: list = []
+            selected1: set = set()
+            selected2: set = set()
+            for pos in np.argsort(-ratings, kind="stable").tolist():
+                if rows[pos] not in selected1 and cols[pos] not in selected2:
+                    selection.append((int(rows[pos]), int(cols[pos]), float(ratings[pos])))
+                    selected1.add(rows[pos])
+                    selected2.add(cols[pos])
+            return selection
+        selector = AlignmentSelector(self.threshold, list(zip(rows.tolist(), cols.tolist(), ratings.tolist())),
+                                     0, 1, 2, self.tie_break)
+        selector.optimize_combination(method)
+        return selector.optimal_combination
+
     def _enforce_threshold(self, combinations: list) -> list:
         """ remove elements from list if their similarity is below threshold
 
@@ -56,26 +106,98 @@ class AlignmentSelector:
 
     def _optimal_selection_multicore(self, matches: list) -> list:
         """ optimize overall matching quality assuming that only two elements can
-        be matched; directly write to list of lists - use all available cores
-        NOTE: helpful for larger numbers of matches (break-even at about 8 matches)
+        be matched; independent components are solved separately, large components
+        are distributed across all available cores
+        NOTE: helpful for larger components (break-even at about 8 matches)
 
         :param matches: list of all potential matches
         :return: one possible combination w/ the highest score
         """
-        if not matches:
-            results: list = [[[[]]]]
-        else:
-            reps = len(matches)
-            tasks: list = zip(it.repeat([], reps), it.repeat(.0, reps), [[m] for m in matches], it.repeat(matches, reps))
-            with mp.Pool(processes=None) as pool:
-                results = pool.starmap(self._next_level, tasks)
-            results.sort(key=lambda x: x[1], reverse=True)
-        return results[0][0][0]
+        return self._select_by_component(matches, "exhaustive", multicore=True)
 
     def _optimal_selection(self, matches: list) -> list:
         """ optimize overall matching quality assuming that only two elements can
-        be matched; directly write to list of lists
-        NOTE: helpful for smaller numbers of matches
+        be matched; independent components are solved separately
+        NOTE: helpful for smaller components
+
+        :param matches: list of all potential matches
+        :return: one possible combination w/ the highest score
+        """
+        return self._select_by_component(matches, "exhaustive")
+
+    def _optimal_lsa_selection(self, matches: list) -> list:
+        """ optimize overall matching quality assuming that only two elements can
+        be matched; independent components are solved separately as maximum weight
+        bipartite matchings via the Hungarian algorithm, i.e., in polynomial time
+
+        :param matches: list of all potential matches
+        :return: one possible combination w/ the highest score
+        """
+        return self._select_by_component(matches, "assignment")
+
+    def _select_by_component(self, matches: list, solver: str, multicore: bool = False) -> list:
+        """ split matches into connected components and combine the optimal selections
+        for the components; singleton components are selected directly
+
+        :param matches: list of all potential matches
+        :param solver: solver applied to the components - exhaustive or assignment
+        :param multicore: solve components w at least _pool_min_size matches in a process pool
+        :return: union of the components' selections, in the order of matches
+        """
+        selected: list = []
+        tasks: list = []
+        for component in self._split_components(matches):
+            if len(component) == 1:
+                selected.append(component[0][0])
+            elif multicore and len(component) >= self._pool_min_size:
+                tasks.append((solver, component))
+            else:
+                selected.extend(_solve_component(solver, component))
+        if tasks:
+            processes = min(len(tasks), mp.cpu_count())
+            with mp.Pool(processes=processes) as pool:
+                results = pool.starmap(_solve_component, tasks,
+                                       chunksize=max(1, len(tasks) // (4 * processes)))
+            selected.extend(pos for result in results for pos in result)
+        return [matches[pos] for pos in sorted(selected)]
+
+    def _split_components(self, matches: list) -> list:
+        """ split matches into connected components of the bipartite graph of uid1 and
+        uid2 using union-find; matches are reduced to lightweight tuples
+
+        :param matches: list of all potential matches
+        :return: list of components - lists of (position, uid1 node, uid2 node, rating)
+        """
+        nodes: dict = {}
+        parents: list = []
+
+        def _node(key) -> int:
+            if key not in nodes:
+                nodes[key] = len(parents)
+                parents.append(len(parents))
+            return nodes[key]
+
+        def _find(node: int) -> int:
+            root = node
+            while parents[root] != root:
+                root = parents[root]
+            while parents[node] != root:
+                parents[node], node = root, parents[node]
+            return root
+
+        edges = []
+        for pos, m in enumerate(matches):
+            edge = (pos, _node((1, self._hashable(m[self.uid1_pos]))),
+                    _node((2, self._hashable(m[self.uid2_pos]))), m[self.rating_pos])
+            parents[_find(edge[1])] = _find(edge[2])
+            edges.append(edge)
+        components: dict = {}
+        for edge in edges:
+            components.setdefault(_find(edge[1]), []).append(edge)
+        return list(components.values())
+
+    def _exhaustive_selection(self, matches: list) -> list:
+        """ optimize overall matching quality by checking all combinations recursively
 
         :param matches: list of all potential matches
         :return: one possible combination w/ the highest score
@@ -86,6 +208,44 @@ class AlignmentSelector:
             combos, _ = self._next_level([], 0.0, [], matches)
         return combos[0]
 
+    def _assignment_selection(self, matches: list) -> list:
+        """ optimize overall matching quality as maximum weight bipartite matching
+        via linear_sum_assignment on a dense score matrix
+        NOTE: if there are several matches for the same pair of elements, only the
+        first one w the highest rating is considered
+
+        :param matches: list of all potential matches
+        :return: one possible combination w/ the highest score, in the order of matches
+        """
+        if not matches:
+            return []
+        uids1: dict = {}
+        uids2: dict = {}
+        cells: dict = {}
+        for pos, m in enumerate(matches):
+            cell = (uids1.setdefault(self._hashable(m[self.uid1_pos]), len(uids1)),
+                    uids2.setdefault(self._hashable(m[self.uid2_pos]), len(uids2)))
+            if cell not in cells or m[self.rating_pos] > matches[cells[cell]][self.rating_pos]:
+                cells[cell] = pos
+        scores = np.zeros((len(uids1), len(uids2)))
+        for cell, pos in cells.items():
+            scores[cell] = matches[pos][self.rating_pos]
+        rows, cols = linear_sum_assignment(scores, maximize=True)
+        # NOTE: cells w/o match may be assigned to complete the assignment - these are dropped
+        selected = sorted(cells[cell] for cell in zip(rows.tolist(), cols.tolist()) if cell in cells)
+        return [matches[pos] for pos in selected]
+
+    @classmethod
+    def _hashable(cls, uid):
+        """ convert uids to hashable keys, e.g., individuals given as [individual, name]
+
+        :param uid: element identifier as used in the matches
+        :return: hashable representation of uid
+        """
+        if isinstance(uid, list):
+            return tuple(cls._hashable(e) for e in uid)
+        return uid
+
     @staticmethod
     def _remove_duplicates(lst: list) -> list:
         """ sort nested list and remove duplicates from nested list
@@ -152,22 +312,54 @@ class AlignmentSelector:
 
     def _greedy_selection(self, matches: list) -> list:
         """ greedy selection of best matches; a string may only be listed in one match
-        sorts the matches first to improve performance
+        sorts a copy of the matches first and tracks elements already selected in sets
 
         :param matches: list of all potential matches
         :return: greedily selected list of matches
         """
         # NOTE: in case of several matches involving the same element w the same rating
-        # the first one is chosen - may result in non-deterministic results
+        # the first one according to tie_break is chosen, defaults to input order
+        if self.tie_break:
+            ordered = sorted(matches, key=lambda x: (-x[self.rating_pos], self.tie_break(x)))
+        else:
+            ordered = sorted(matches, key=lambda x: x[self.rating_pos], reverse=True)
         selection: list = []
-        matches.sort(key=lambda x: x[-1], reverse=True)
-        for m in matches:
-            selection_related = [e for e in selection if e[self.uid1_pos] == m[self.uid1_pos] or
-                                 e[self.uid2_pos] == m[self.uid2_pos]]
-            if not selection_related:
+        selected1: set = set()
+        selected2: set = set()
+        for m in ordered:
+            uid1 = self._hashable(m[self.uid1_pos])
+            uid2 = self._hashable(m[self.uid2_pos])
+            if uid1 not in selected1 and uid2 not in selected2:
                 selection.append(m)
+                selected1.add(uid1)
+                selected2.add(uid2)
         return selection
 
+    def optimize_stream(self, candidates: Iterable, top_k: int = 1) -> None:
+        """ greedy selection for candidates provided as iterator, e.g., by a generator;
+        only the top_k candidates per first and per second element are retained, so
+        that memory is bounded by the number of elements rather than the number of
+        candidates
+        NOTE: the selection equals the greedy selection for all candidates if top_k is
+        large enough; ties at the top_k boundary are resolved in input order
+
+        :param candidates: iterable of potential matches
+        :param top_k: number of candidates retained per element
+        """
+        heaps1: dict = defaultdict(list)
+        heaps2: dict = defaultdict(list)
+        for counter, m in enumerate(candidates):
+            if not m[self.rating_pos] > self.threshold:
+                continue
+            entry = (m[self.rating_pos], -counter, m)
+            for heap in heaps1[self._hashable(m[self.uid1_pos])], heaps2[self._hashable(m[self.uid2_pos])]:
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+        retained = {-e[1]: e[2] for heaps in (heaps1, heaps2) for heap in heaps.values() for e in heap}
+        self.optimal_combination = self._greedy_selection([retained[c] for c in sorted(retained)])
+
     def overall_score(self, elems: list) -> float:
         """ calculate overall score
 
@@ -177,6 +369,20 @@ class AlignmentSelector:
         return sum([m[self.rating_pos] for m in elems])
 
 
+def _solve_component(solver: str, component: list) -> list:
+    """ select matches for a single connected component; defined on module level so
+    that process pool tasks only include the lightweight component
+
+    :param solver: exhaustive or assignment
+    :param component: list of (position, uid1 node, uid2 node, rating)
+    :return: positions of the selected matches
+    """
+    selector = AlignmentSelector(float("-inf"), component, 1, 2, 3)
+    solvers = {"exhaustive": selector._exhaustive_selection,
+               "assignment": selector._assignment_selection}
+    return [m[0] for m in solvers[solver](component)]
+
+
 if __name__ == "__main__":
     matches = [("c", ('1:f', 'felix'), ('2:ax', 'alex'), "d", 0.4),
                ("c", ('1:f', 'felix'), ('2:l', 'luis'), "d", 0.19999999999999996),
@@ -200,7 +406,7 @@ if __name__ == "__main__":
                ("c", ('1:b', 'blex'), ('2:ac', 'alec'), "d", 0.5)]
     selector = AlignmentSelector(.6, matches, 1, 2, -1)
 
-    for mtype in "greedy", "greedy_depr", "optimal_sc", "optimal_mc":
+    for mtype in "greedy", "greedy_depr", "optimal_sc", "optimal_mc", "optimal_lsa":
         tic = timeit.default_timer()
         selector.optimize_combination(mtype)
         toc = timeit.default_timer()
@@ -7,6 +7,7 @@ import yaml
 from owlready2 import World
 
 import decorators
+import onto_registry as reg
 import quality_assessment as qa
 import translate_onto as to
 
@@ -26,8 +27,7 @@ def extract_class_info(paths: list) -> list:
         return name
 
     for path in set(paths):
-        world = World()
-        onto = world.get_ontology(path).load()
+        onto = reg.REGISTRY.get_ontology(path)
         # assert all([len(c.label.en)==1 for c in onto.classes()]),\
         #     f"more than one English label def'ed per class"
         classes = [(c.iri, _get_label_or_name(c).lower()) for c in onto.classes()]
@@ -39,7 +39,7 @@ def extract_class_info(paths: list) -> list:
 @decorators.timeme
 def create_baseline_alignment(lst1: list, lst2: list, algtype: str, threshold: float) -> list:
     matcher = sm.StringMatcher(lst1, lst2, -1, -1, threshold)
-    matcher.match_lists()
+    matcher.match_lists(blocked=True, backend="rapidfuzz")
     matcher.calc_alignment(algtype)
     print(matcher.score)
     return matcher.optimal_combination
@@ -48,7 +48,7 @@ def create_baseline_alignment(lst1: list, lst2: list, algtype: str, threshold: f
 def run_n_print(path1: str, path2: str, threshold: float) -> None:
     print(f"baseline for {path1} and {path2}")
     class_info = extract_class_info([path1, path2])
-    for algtype in "greedy", "optimal_sc", "optimal_mc":
+    for algtype in "greedy", "optimal_lsa":
         combination = create_baseline_alignment(class_info[path1], class_info[path2], algtype, threshold)
         print(f"{algtype} alignment:\n{combination}")
 
@@ -13,11 +13,12 @@ import yaml
 
 import extract_nltk_wordnet as extr
 import load_vocab as lv
+import onto_registry as reg
 
 from collections import defaultdict
 from nltk.corpus import wordnet
 from nltk.stem import WordNetLemmatizer
-from owlready2 import get_ontology, default_world, World, IRIS, Thing,\
+from owlready2 import get_ontology, default_world, IRIS, Thing,\
                       ObjectProperty, DatatypeProperty
 from spacy.lemmatizer import Lemmatizer
 from spacy.matcher import Matcher
@@ -32,6 +33,19 @@ with open("config.yml", "r") as ymlfile:
     IMPLICIT_DOMAIN_RATING = cfg["priors"]["semantic"]["domain-specific"]
     IMPLICIT_SYN_RATING = cfg["priors"]["semantic"]["implicit-syn"]
     IMPLICIT_ANT_RATING = cfg["priors"]["semantic"]["implicit-ant"]
+    BATCH_SIZE = cfg["settings"]["spacy"]["batch-size"]
+    N_PROCESS = cfg["settings"]["spacy"]["n-process"]
+
+# matchers for detecting passive and active reified OP labels
+# NOTE: spacy cannot ignore reified labels w _optional_ ADP - have to remove those manually
+PASSIVE_MATCHER = Matcher(NLP.vocab)
+PASSIVE_MATCHER.add("passive_prop", None,
+                    [{'DEP':'aux','OP':'*'},{'DEP':'auxpass'},{'TAG':'VBN'}],
+                    [{'POS':'VERB'},{'POS':'ADP'}],
+                    [{'POS':{'IN':['PROPN','NOUN']}}])
+ACTIVE_REIFIED_MATCHER = Matcher(NLP.vocab)
+ACTIVE_REIFIED_MATCHER.add("active_reified_prop", None,
+                           [{'POS':{'IN':['PROPN','NOUN']}},{'POS':'ADP'}])
 
 def create_query(iri, elem_type):
     """SPARQL query to extract classes, labels, and language tags"""
@@ -47,19 +61,17 @@ def create_query(iri, elem_type):
     return query
 
 def get_labels(path, iri, elem_type):
-    """query onto and return results as list - onto must already be loaded"""
+    """query onto and return results as list - onto is loaded via the registry"""
     query = create_query(iri, elem_type)
-    my_world = World()
-    onto = my_world.get_ontology(path).load()
-    graph = my_world.as_rdflib_graph()
-    results = list(graph.query(query))
+    results = reg.REGISTRY.query(path, query)
     return results
 
-def analyze_label(elem_iri, label, elem_type):
+def analyze_label(elem_iri, label, elem_type, doc=None):
     """
     split label into parts and analyze
     consists of: [IRI, label, [[text, lemma, pos, tag, dep], ...], passive]
     passive is only set for ops
+    :param doc: spacy doc for label, processed on demand if not provided
     """
     label_infos = [elem_iri, label, [], None]
     assert len(label.split()) >= 1, "analyze_label: empty label"
@@ -84,7 +96,8 @@ def analyze_label(elem_iri, label, elem_type):
                 label_infos[-1] = False
     # use spacy if label consists of more than one word
     elif len(label.split()) > 1:
-        doc = NLP(label)
+        if doc is None:
+            doc = NLP(label)
         for token in doc:
             # NOTE: keep only specific POS
             if token.pos_ in ["NOUN", "VERB", "ADJ", "ADV", "ADP", "PROPN", "X"]:
@@ -95,69 +108,108 @@ def analyze_label(elem_iri, label, elem_type):
             elif token.pos_ == "X" and elem_type == "owl:ObjectProperty":
                 label_infos[2][-1][2] = "VERB"
         if elem_type == "owl:ObjectProperty":
-            passive_match = None
-            active_reified_match = None
-            passive_prop_pattern_1 = [{'DEP':'aux','OP':'*'},{'DEP':'auxpass'},{'TAG':'VBN'}]
-            passive_prop_pattern_2 = [{'POS':'VERB'},{'POS':'ADP'}]
-            reified_prop_pattern = [{'POS':{'IN':['PROPN','NOUN']}}]
-            active_reified_prop_pattern = [{'POS':{'IN':['PROPN','NOUN']}},{'POS':'ADP'}]
-            # NOTE: spacy cannot ignore reified labels w _optional_ ADP - have to remove those manually
-            matcher = Matcher(NLP.vocab)
-            matcher.add("passive_prop", None, passive_prop_pattern_1, passive_prop_pattern_2, reified_prop_pattern)
-            passive = matcher(doc)
-            for match_id, start, end in passive:
-                string_id = NLP.vocab.strings[match_id]
-                span = doc[start:end]
-                passive_match = span.text
-            matcher.remove("passive_prop")
-            matcher.add("active_reified_prop", None, active_reified_prop_pattern)
-            active = matcher(doc)
-            for match_id, start, end in active:
-                string_id = NLP.vocab.strings[match_id]
-                span = doc[start:end]
-                active_reified_match = span.text
+            passive_match = any(PASSIVE_MATCHER(doc))
+            active_reified_match = any(ACTIVE_REIFIED_MATCHER(doc))
             if passive_match and not active_reified_match:
                 label_infos[-1] = True
             else:
                 label_infos[-1] = False
     return label_infos
 
-def analyze_all_labels(path, iri):
-    """get all labels from onto and analyze them"""
+def analyze_all_labels(path, iri, batch_size=BATCH_SIZE, n_process=N_PROCESS):
+    """
+    get all labels from onto and analyze them
+    multi-word labels of all element types are processed by spacy in batches
+    """
     elem_types = ["owl:Class", "owl:ObjectProperty", "owl:DatatypeProperty"]
     # extract all iris with labels
     all_labels = [None, None, None]
     for counter, elem_type in enumerate(elem_types):
-        all_labels[counter] = get_labels(path, iri, elem_type)
+        all_labels[counter] = [(elem[0], str(elem[1]).lower()) for elem in get_labels(path, iri, elem_type)]
+    # process all multi-word labels at once
+    multi_word_labels = list(dict.fromkeys(label for label_subset in all_labels for _, label in label_subset\
+                                           if len(label.split()) > 1))
+    docs = dict(zip(multi_word_labels, NLP.pipe(multi_word_labels, batch_size=batch_size, n_process=n_process)))
     # analyze the label for every iri
     all_label_infos = [[], [], []]
     for counter, label_subset in enumerate(all_labels):
-        for elem in label_subset:
-            all_label_infos[counter].append(analyze_label(elem[0], str(elem[1]).lower(), elem_types[counter]))
+        for elem_iri, label in label_subset:
+            all_label_infos[counter].append(analyze_label(elem_iri, label, elem_types[counter], docs.get(label)))
     return all_label_infos
 
+def explicit_match(label_1, label_2, elem_type):
+    """
+    check a single pair of labels for an explicit match
+    :param label_x: [uri, label, [token, lemma, POS, TAG, DEP], passive]
+    :return: explicit match or empty list
+    """
+    explicit_match = []
+    # equivalence
+    if len(label_1[2]) == len(label_2[2]) and label_1[-1] == label_2[-1]:
+        if all([elem1[1] in [elem2[1] for elem2 in label_2[2]] for elem1 in label_1[2]]):
+            explicit_match = [elem_type, str(label_1[0]), str(label_2[0]),\
+                              "equivalence", EXPLICIT_RATING]
+    # subsumption
+    elif len(label_2[2]) < len(label_1[2]) and label_1[-1] == label_2[-1]:
+        if all([elem1[1] in [elem2[1] for elem2 in label_1[2]] for elem1 in label_2[2]]):
+            explicit_match = [elem_type, str(label_1[0]), str(label_2[0]),\
+                              "hyponym", EXPLICIT_RATING]
+    elif len(label_1[2]) < len(label_2[2]) and label_1[-1] == label_2[-1]:
+        if all([elem1[1] in [elem2[1] for elem2 in label_2[2]] for elem1 in label_1[2]]):
+            explicit_match = [elem_type, str(label_1[0]), str(label_2[0]),\
+                              "hypernym", EXPLICIT_RATING]
+    return explicit_match
+
+def create_lemma_index(label_info):
+    """
+    create posting lists for the lemmas of a set of labels
+    :param label_info: list of [uri, label, [token, lemma, POS, TAG, DEP], passive]
+    :return: dict {(passive, lemma): [positions]} and dict {passive: [positions]} for labels wout tokens
+    """
+    lemma_index = defaultdict(list)
+    tokenless = defaultdict(list)
+    for position, elem in enumerate(label_info):
+        if not elem[2]:
+            tokenless[elem[-1]].append(position)
+        for lemma in dict.fromkeys(token[1] for token in elem[2]):
+            lemma_index[(elem[-1], lemma)].append(position)
+    return lemma_index, tokenless
+
 def explicit_compare(label_info_1, label_info_2, elem_type):
-    """compare two sets of elements based on labels in default_lang and return overlap"""
+    """
+    compare two sets of elements based on labels in default_lang and return overlap
+    only pairs sharing at least one lemma are checked - all explicit relations require
+    the lemmas of one label to be a subset of the other label's lemmas
+    """
+    explicit_overlap = []
+    lemma_index, tokenless = create_lemma_index(label_info_2)
+    for elem1 in label_info_1:
+        # NOTE: labels wout tokens trivially subsume or are subsumed by any label w the same passive value
+        if not elem1[2]:
+            candidates = [c for c, elem2 in enumerate(label_info_2) if elem2[-1] == elem1[-1]]
+        else:
+            candidates = set(tokenless[elem1[-1]])
+            for token in elem1[2]:
+                candidates.update(lemma_index.get((elem1[-1], token[1]), []))
+            # NOTE: sort to retain the order of the exhaustive comparison
+            candidates = sorted(candidates)
+        for candidate in candidates:
+            match = explicit_match(elem1, label_info_2[candidate], elem_type)
+            if match:
+                explicit_overlap.append(match)
+    return explicit_overlap
+
+def explicit_compare_deprecated(label_info_1, label_info_2, elem_type):
+    """
+    compare two sets of elements based on labels in default_lang and return overlap
+    NOTE: checks all combinations, this is significantly slower than explicit_compare
+    """
     explicit_overlap = []
     all_combinations = [(x,y) for x in label_info_1 for y in label_info_2]
     for combination in all_combinations:
-        explicit_match = []
-        # equivalence
-        if len(combination[0][2]) == len(combination[1][2]) and combination[0][-1] == combination[1][-1]:
-            if all([elem1[1] in [elem2[1] for elem2 in combination[1][2]] for elem1 in combination[0][2]]):
-                explicit_match = [elem_type, str(combination[0][0]), str(combination[1][0]),\
-                                  "equivalence", EXPLICIT_RATING]
-        # subsumption
-        elif len(combination[1][2]) < len(combination[0][2]) and combination[0][-1] == combination[1][-1]:
-            if all([elem1[1] in [elem2[1] for elem2 in combination[0][2]] for elem1 in combination[1][2]]):
-                explicit_match = [elem_type, str(combination[0][0]), str(combination[1][0]),\
-                                  "hyponym", EXPLICIT_RATING]
-        elif len(combination[0][2]) < len(combination[1][2]) and combination[0][-1] == combination[1][-1]:
-            if all([elem1[1] in [elem2[1] for elem2 in combination[1][2]] for elem1 in combination[0][2]]):
-                explicit_match = [elem_type, str(combination[0][0]), str(combination[1][0]),\
-                                  "hypernym", EXPLICIT_RATING]
-        if explicit_match:
-            explicit_overlap.append(explicit_match)
+        match = explicit_match(combination[0], combination[1], elem_type)
+        if match:
+            explicit_overlap.append(match)
     return explicit_overlap
 
 def append_vocabulary(elems, elem_type, rel):
@@ -245,10 +297,11 @@ def arrange_impl_match(elem_type, elem1, elem2, rel, rating, iter):
     elif iter == 1:
         return [elem_type, elem2, elem1, rel, rating]
 
-def implicit_compare(label_info_1, label_info_2, elem_type):
+def implicit_compare(label_info_1, label_info_2, elem_type, dsvocab=None):
     """
     check two sets of elements for implicit semantic matches
     :param label_info_x: list of [uri, label, [token, lemma, POS, TAG, DEP], passive]
+    :param dsvocab: domain specific vocabulary, loaded from config if not provided
     :return: list of implicit matches
     """
     rels = {"syn": "equivalence",
@@ -265,20 +318,20 @@ def implicit_compare(label_info_1, label_info_2, elem_type):
     ant_dict_2 = dict(append_vocabulary(label_info_2, elem_type, "ant"))
     hype_dict_1 = dict(append_vocabulary(label_info_1, elem_type, "hype"))
     hype_dict_2 = dict(append_vocabulary(label_info_2, elem_type, "hype"))
+    if dsvocab is None:
+        dsvocab = lv.load_vocabulary()
 
     for combination in all_combinations:
         implicit_match = []
-        dsvocab = lv.csv_to_nested_list()
         if dsvocab:
             # check if entire labels are in same domain synset
-            if any([str(combination[0][1]) in synset and str(combination[1][1]) in synset for synset in dsvocab]):
+            if dsvocab.in_same_synset(str(combination[0][1]), str(combination[1][1])):
                 implicit_match = [elem_type, str(combination[0][0]), str(combination[1][0]),\
                                   rels["syn"], IMPLICIT_DOMAIN_RATING]
             # check if entire labels are in different domain synsets
-            for synset1, synset2 in itertools.product(dsvocab, dsvocab):
-                if synset1 != synset2 and str(combination[0][1]) in synset1 and str(combination[1][1]) in synset2:
-                    implicit_match = [elem_type, str(combination[0][0]), str(combination[1][0]),\
-                                      rels["dis"], IMPLICIT_DOMAIN_RATING]
+            if dsvocab.in_different_synsets(str(combination[0][1]), str(combination[1][1])):
+                implicit_match = [elem_type, str(combination[0][0]), str(combination[1][0]),\
+                                  rels["dis"], IMPLICIT_DOMAIN_RATING]
         if not implicit_match:
             # equivalent
             # NOTE: there may be limitations due to translation issues, eg, "very very fast car" eq_to "very fast car"
@@ -343,8 +396,100 @@ def implicit_compare(label_info_1, label_info_2, elem_type):
             implicit_overlap.append(implicit_match)
     return implicit_overlap
 
+class KeyedMaximum:
+    """track the maximum value as well as the maximum value for any other key"""
+
+    def __init__(self) -> None:
+        self.best: tuple = None
+        self.second: tuple = None
+
+    def update(self, value, key) -> None:
+        """ add value for key
+
+        :param value: comparable value, e.g., a rating
+        :param key: key identifying the entity the value belongs to
+        """
+        if self.best is None or key == self.best[1]:
+            if self.best is None or value > self.best[0]:
+                self.best = (value, key)
+        elif value > self.best[0]:
+            self.second = self.best
+            self.best = (value, key)
+        elif self.second is None or value > self.second[0]:
+            self.second = (value, key)
+
+    def max_other(self, key):
+        """return maximum value for keys other than key, None if there is none"""
+        if self.best is not None and self.best[1] != key:
+            return self.best[0]
+        if self.second is not None:
+            return self.second[0]
+        return None
+
+def remove_duplicates(matches, duplicates):
+    """remove matches at positions in duplicates as well as matches equal to them"""
+    duplicate_values = {tuple(matches[pos]) for pos in duplicates}
+    return [elem for elem in matches if not tuple(elem) in duplicate_values]
+
 def reduce_vector(matches):
-    """remove possibly contradictory tuples from matching vector"""
+    """
+    remove possibly contradictory tuples from matching vector
+    matches are grouped by notions so that only matches sharing a notion are compared,
+    cp. reduce_vector_deprecated for the pairwise rules
+    """
+    duplicates = set()
+    keys = [tuple(elem[:3]) for elem in matches]
+    # same notions
+    groups = defaultdict(list)
+    for pos, key in enumerate(keys):
+        groups[key].append(pos)
+    for group in groups.values():
+        max_rating = max(matches[pos][-1] for pos in group)
+        max_equivalence = any(matches[pos][-1] == max_rating and matches[pos][3] == "equivalence" for pos in group)
+        for pos in group:
+            if matches[pos][-1] < max_rating or\
+               max_equivalence and matches[pos][3] in ["hyponym", "hypernym"]:
+                duplicates.add(pos)
+    # one notion same - group by first and by second notion
+    for position, subsumption in ((1, "hyponym"), (2, "hypernym")):
+        buckets = defaultdict(list)
+        for pos, elem in enumerate(matches):
+            buckets[elem[position]].append(pos)
+        for bucket in buckets.values():
+            # different equivalents - higher rating counts, first one in case of ties
+            equivalences = [pos for pos in bucket if matches[pos][3] == "equivalence"]
+            best = KeyedMaximum()
+            for pos in equivalences:
+                best.update((matches[pos][-1], -pos), keys[pos])
+            for pos in equivalences:
+                other = best.max_other(keys[pos])
+                if other is not None and other > (matches[pos][-1], -pos):
+                    duplicates.add(pos)
+            # either equivalent class or superclass - earlier match counts in case of ties
+            earlier = KeyedMaximum()
+            for pos in bucket:
+                if matches[pos][3] == subsumption:
+                    other = earlier.max_other(keys[pos])
+                    if other is not None and other >= matches[pos][-1]:
+                        duplicates.add(pos)
+                if matches[pos][3] in ["equivalence", subsumption]:
+                    earlier.update(matches[pos][-1], keys[pos])
+            later = KeyedMaximum()
+            for pos in reversed(bucket):
+                if matches[pos][3] in ["equivalence", subsumption]:
+                    other = later.max_other(keys[pos])
+                    if other is not None and matches[pos][-1] < other:
+                        duplicates.add(pos)
+                if matches[pos][3] == subsumption:
+                    later.update(matches[pos][-1], keys[pos])
+    unique_matches = remove_duplicates(matches, duplicates)
+    return unique_matches
+
+def reduce_vector_deprecated(matches):
+    """
+    remove possibly contradictory tuples from matching vector
+    NOTE: compares all pairs of matches, this is significantly slower than reduce_vector
+    """
     duplicates = []
     # NOTE: duplicates may be returned for iterative approach
     for elem1, elem2 in itertools.combinations(matches, 2):
@@ -379,10 +524,11 @@ def main(iri1, path1, iri2, path2):
     elem_types = ["owl:Class", "owl:ObjectProperty", "owl:DatatypeProperty"]
     analyzed_labels_1 = analyze_all_labels(path1, iri1)
     analyzed_labels_2 = analyze_all_labels(path2, iri2)
+    dsvocab = lv.load_vocabulary()
     matches = []
     for counter, elem_type in enumerate(elem_types):
         matches.extend(explicit_compare(analyzed_labels_1[counter], analyzed_labels_2[counter], elem_type))
-        matches.extend(implicit_compare(analyzed_labels_1[counter], analyzed_labels_2[counter], elem_type))
+        matches.extend(implicit_compare(analyzed_labels_1[counter], analyzed_labels_2[counter], elem_type, dsvocab))
     # remove duplicates, higher rating counts
     matches = reduce_vector(matches)
     return matches
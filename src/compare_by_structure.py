@@ -12,9 +12,11 @@ import yaml
 
 import build_query as bq
 import compare_by_labels as cbl
+import onto_registry as reg
 import similarity_boundary as sb
 
-from owlready2 import get_ontology, default_world, World, IRIS, sync_reasoner
+from collections import defaultdict
+from owlready2 import default_world, World, IRIS, sync_reasoner
 
 with open("config.yml", "r") as ymlfile:
     cfg = yaml.safe_load(ymlfile)
@@ -36,6 +38,9 @@ with open("config.yml", "r") as ymlfile:
     STRUCT_OP_WEIGHT = cfg["priors"]["structural"]["op-rating"]["weighting"]
     STRUCT_CL_WEIGHT = cfg["priors"]["structural"]["class-rating"]["weighting"]
 
+# number of class pairs for which property vectors are compared at once
+CHUNK_SIZE = 65536
+
 def reasoning(path, file):
     """run reasoner and store results"""
     my_world = World()
@@ -45,19 +50,15 @@ def reasoning(path, file):
     onto.save(file)
 
 def query_onto(path, query):
-    """query onto and return results as list - onto must be already loaded"""
-    my_world = World()
-    onto = my_world.get_ontology(path).load()
-    graph = my_world.as_rdflib_graph()
+    """query onto and return results as list - onto is loaded via the registry"""
 # NOTE: use of query_owlready messes up ranges of dps
-    results = list(graph.query(query))
+    results = reg.REGISTRY.query(path, query)
     return results
 
 def get_basics(path):
     """get classes, object props, and datatype props from onto"""
     basics = [None, None, None]
-    my_world = World()
-    onto = my_world.get_ontology(path).load()
+    onto = reg.REGISTRY.get_ontology(path)
     basics[0] = onto.classes()
     basics[1] = onto.object_properties()
     basics[2] = onto.data_properties()
@@ -305,6 +306,48 @@ def domain_range_check(position, axiom1, axiom2, class_vector, inverse=False):
         rel = "disjoint"
     return rel
 
+def positive_sim_rows(matrix_1, rows_1, matrix_2, rows_2, chunk_size=CHUNK_SIZE):
+    """
+    calculate positive_sim for pairs of rows from two boolean matrices
+    pairs are processed in chunks to limit memory consumption
+    :param matrix_x: boolean matrices w the same number of columns
+    :param rows_x: arrays of row indices, the pairs are (rows_1[i], rows_2[i])
+    :return: array of similarities
+    """
+    similarities = np.zeros(len(rows_1))
+    for start in range(0, len(rows_1), chunk_size):
+        vec_a = matrix_1[rows_1[start:start + chunk_size]]
+        vec_b = matrix_2[rows_2[start:start + chunk_size]]
+        both = np.count_nonzero(vec_a & vec_b, axis=1)
+        baseline = np.maximum(1, np.count_nonzero(vec_a | vec_b, axis=1))
+        similarities[start:start + chunk_size] = both / baseline
+    return similarities
+
+def create_incidence_matrix(class_axioms, props, extended=True):
+    """
+    create boolean matrix indicating which class is related to which prop via class axioms
+    set extended to False to only consider axioms in which class is subject
+    :param class_axioms: results of the class axioms query
+    :param props: prop iris that make up the columns, once per case (subject and object)
+    :return: dict {class iri: row} and matrix; the last row is empty and represents all other classes
+    """
+    cases = 2 if extended else 1
+    prop_columns = defaultdict(list)
+    for counter, prop in enumerate(props):
+        prop_columns[prop].append(counter)
+    class_rows = {}
+    entries = set()
+    for class_axiom in class_axioms:
+        for case in range(cases):
+            for column in prop_columns.get(str(class_axiom[3]), []):
+                row = class_rows.setdefault(str(class_axiom[4 * case]), len(class_rows))
+                entries.add((row, column + len(props) * case))
+    matrix = np.zeros((len(class_rows) + 1, len(props) * cases), dtype=bool)
+    if entries:
+        rows, columns = zip(*entries)
+        matrix[list(rows), list(columns)] = True
+    return class_rows, matrix
+
 def create_class_vector(class_vector, class_axioms_1, class_axioms_2, prop_vector, extended=True):
     """
     create vectors for classes based on props
@@ -313,28 +356,16 @@ def create_class_vector(class_vector, class_axioms_1, class_axioms_2, prop_vecto
     # create reduced class vector only considering equivalent and subsuming properties
     # NOTE: possibly extend for inverse relations
     reduced_prop_vec = [elem for elem in prop_vector if elem[3] in ["equivalence", "hypernym", "hyponym"]]
-    for c in class_vector:
-        if extended:
-            length = 2
-        else:
-            length = 1
-        prop_vec_1 = [0] * len(reduced_prop_vec) * length
-        prop_vec_2 = [0] * len(reduced_prop_vec) * length
-        if c[3] in ["equivalence", "hypernym", "hyponym"]:
-            for case in range(2):
-                if not extended and case == 1:
-                    break
-                for counter, prop in enumerate(reduced_prop_vec):
-                    if any([c[1] == str(class_axiom[4 * case]) and prop[1] == str(class_axiom[3])\
-                            for class_axiom in class_axioms_1]):
-                        prop_vec_1[counter + len(reduced_prop_vec) * case] = 1
-                    if any([c[2] == str(class_axiom[4 * case ]) and prop[2] == str(class_axiom[3])\
-                            for class_axiom in class_axioms_2]):
-                        prop_vec_2[counter + len(reduced_prop_vec) * case] = 1
-            # NOTE: cos_sim may be used as an alternative similarity measure
-            c[-1] = positive_sim(prop_vec_1, prop_vec_2)
-        # NOTE: (missing) relations to other nodes are not an indicator for disjoints
-        # NOTE: disjoints can semantically be confirmed via a TLO
+    class_rows_1, matrix_1 = create_incidence_matrix(class_axioms_1, [prop[1] for prop in reduced_prop_vec], extended)
+    class_rows_2, matrix_2 = create_incidence_matrix(class_axioms_2, [prop[2] for prop in reduced_prop_vec], extended)
+    relevant = [c for c in class_vector if c[3] in ["equivalence", "hypernym", "hyponym"]]
+    rows_1 = np.array([class_rows_1.get(c[1], len(class_rows_1)) for c in relevant], dtype=int)
+    rows_2 = np.array([class_rows_2.get(c[2], len(class_rows_2)) for c in relevant], dtype=int)
+    # NOTE: cos_sim may be used as an alternative similarity measure
+    for c, similarity in zip(relevant, positive_sim_rows(matrix_1, rows_1, matrix_2, rows_2)):
+        c[-1] = float(similarity)
+    # NOTE: (missing) relations to other nodes are not an indicator for disjoints
+    # NOTE: disjoints can semantically be confirmed via a TLO
     return class_vector
 
 def check_disjoints(entity_1, entity_2):
@@ -347,40 +378,42 @@ def combine_ratings(semantic_vec, structural_vec):
     # NOTE: assumes that elems are in positions 1 and 2, ratings are in position 3
     # NOTE: assumes that there are no duplicate elements in vectors
     # NOTE: assumes that structural_vec subsumes semantic_vec
-    assert all([sema[:4] in [stru[:4] for stru in structural_vec] for sema in semantic_vec]),\
+    # NOTE: if there are several semantic ratings for a match, the last one is used
+    semantic_ratings = {tuple(sema[:4]): sema[-1] for sema in semantic_vec}
+    assert not semantic_ratings.keys() - {tuple(stru[:4]) for stru in structural_vec},\
            "combine_ratings: structural vector does not subsume semantic vector"
     integrated_vec = []
     for stru in structural_vec:
-        rating = stru[-1] * STRUCT_CL_WEIGHT / (SEM_WEIGHT + STRUCT_CL_WEIGHT)
-        for sema in semantic_vec:
-            if sema[:4] == stru[:4]:
-                rating = (sema[-1] * SEM_WEIGHT + stru[-1] * STRUCT_CL_WEIGHT) /\
-                         (SEM_WEIGHT + STRUCT_CL_WEIGHT)
+        sema_rating = semantic_ratings.get(tuple(stru[:4]))
+        if sema_rating is None:
+            rating = stru[-1] * STRUCT_CL_WEIGHT / (SEM_WEIGHT + STRUCT_CL_WEIGHT)
+        else:
+            rating = (sema_rating * SEM_WEIGHT + stru[-1] * STRUCT_CL_WEIGHT) /\
+                     (SEM_WEIGHT + STRUCT_CL_WEIGHT)
         integrated_vec.append(stru[:4] + [rating])
     return integrated_vec
 
+def index_axioms(axioms):
+    """index axiom query results by their subject"""
+    # NOTE: if there are several axioms for a subject, the last one is used
+    return {str(axiom[0]): axiom for axiom in axioms}
+
 def create_prop_vector(op_vector, op_axioms_1, op_axioms_2, dp_vector, dp_axioms_1, dp_axioms_2, class_vector):
     """create vector of common properties"""
     # NOTE: assumes that there is exactly one axiom per property
+    op_index_1, op_index_2 = index_axioms(op_axioms_1), index_axioms(op_axioms_2)
+    dp_index_1, dp_index_2 = index_axioms(dp_axioms_1), index_axioms(dp_axioms_2)
     for prop_tuple in op_vector:
         if prop_tuple[3] in ["equivalence", "hyponym", "hypernym"]:
-            for axiom in op_axioms_1:
-                if str(axiom[0]) == prop_tuple[1]:
-                    p1i = axiom
-            for axiom in op_axioms_2:
-                if str(axiom[0]) == prop_tuple[2]:
-                    p2i = axiom
+            p1i = op_index_1[prop_tuple[1]]
+            p2i = op_index_2[prop_tuple[2]]
             prop_tuple[-1] = (SEM_WEIGHT*prop_tuple[-1] +\
                               STRUCT_OP_WEIGHT*calc_op_sim(p1i, p2i, class_vector, prop_tuple[3])) /\
                              (SEM_WEIGHT + STRUCT_OP_WEIGHT)
     for prop_tuple in dp_vector:
         if prop_tuple[3] in ["equivalence", "hyponym", "hypernym"]:
-            for axiom in dp_axioms_1:
-                if str(axiom[0]) == prop_tuple[1]:
-                    p1i = axiom
-            for axiom in dp_axioms_2:
-                if str(axiom[0]) == prop_tuple[2]:
-                    p2i = axiom
+            p1i = dp_index_1[prop_tuple[1]]
+            p2i = dp_index_2[prop_tuple[2]]
             prop_tuple[-1] = (SEM_WEIGHT*prop_tuple[-1] +\
                               STRUCT_DP_WEIGHT*calc_dp_sim(p1i, p2i, class_vector, prop_tuple[3])) /\
                              (SEM_WEIGHT + STRUCT_DP_WEIGHT)
@@ -391,7 +424,36 @@ def create_prop_vector(op_vector, op_axioms_1, op_axioms_2, dp_vector, dp_axioms
     return prop_vector
 
 def reduce_prop_vector(matches):
-    """remove possibly contradictory tuples from matching vector"""
+    """
+    remove possibly contradictory tuples from matching vector
+    matches are grouped by relation and notions so that only matches sharing a notion are compared,
+    cp. reduce_prop_vector_deprecated for the pairwise rules
+    """
+    duplicates = set()
+    buckets = defaultdict(list)
+    for pos, elem in enumerate(matches):
+    # NOTE: in case of disjoints, hypernyms, and hyponyms, there may be several matches
+        if elem[3] in ["hypernym", "hyponym", "disjoint"]:
+            buckets[(elem[3], elem[1], elem[2])].append(pos)
+        else:
+            buckets[(elem[3], 1, elem[1])].append(pos)
+            buckets[(elem[3], 2, elem[2])].append(pos)
+    for bucket in buckets.values():
+        # earlier matches w the same or a higher rating count
+        earlier = cbl.KeyedMaximum()
+        for pos in bucket:
+            other = earlier.max_other(id(matches[pos]))
+            if other is not None and other >= matches[pos][-1]:
+                duplicates.add(pos)
+            earlier.update(matches[pos][-1], id(matches[pos]))
+    unique_matches = cbl.remove_duplicates(matches, duplicates)
+    return unique_matches
+
+def reduce_prop_vector_deprecated(matches):
+    """
+    remove possibly contradictory tuples from matching vector
+    NOTE: compares all pairs of matches, this is significantly slower than reduce_prop_vector
+    """
     duplicates = []
     for elem1, elem2 in itertools.combinations(matches, 2):
     # NOTE: in case of disjoints, hypernyms, and hyponyms, there may be several matches
@@ -441,8 +503,8 @@ def get_semantic_elem_combos(iri1, path1, iri2, path2):
 def get_all_elem_combos(path1, path2):
     """get all combos of elems, ie classes, ops, and dps, from two ontos"""
     supported_relations = ["equivalence", "disjoint", "inverse", "hypernym", "hyponym"]
-    onto1 = get_ontology(path1).load()
-    onto2 = get_ontology(path2).load()
+    onto1 = reg.REGISTRY.get_ontology(path1)
+    onto2 = reg.REGISTRY.get_ontology(path2)
     # entities from ontos
     classes_1 = [elem.iri for elem in onto1.classes()]
     classes_2 = [elem.iri for elem in onto2.classes()]
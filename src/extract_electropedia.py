@@ -2,35 +2,39 @@
 """
 module for finding words related to input in electropedia
 http://www.electropedia.org/
+term ids and translations are cached so that each term and each entry is only requested once
 """
 
+import atexit
 import bs4
 import requests
+import sqlite3
 import sys
+import urllib.parse
 import webbrowser
+import yaml
+
+from concurrent.futures import ThreadPoolExecutor
+
+with open("config.yml", "r") as ymlfile:
+    cfg = yaml.safe_load(ymlfile)
+    BASE_URL = cfg["settings"]["electropedia"]["base-url"]
+    WORKERS = cfg["settings"]["electropedia"]["workers"]
+    TIMEOUT = cfg["settings"]["electropedia"]["timeout"]
+    CACHE_FILE = cfg["settings"]["electropedia"]["cache-file"]
 
 SOURCE_LANGS = ["ar", "cs", "de", "en", "es", "fi", "fr", "it", "ja", "ko", "nb",\
                 "nn", "pl", "pt", "ru", "sl", "sr", "sv", "zh"]
 SINK_LANGS = ["ar", "de", "en", "es", "fr", "it", "ko", "ja", "pl", "pt", "zh"]
 
-def get_id(search_term, source_lang):
-    """get ID for specific term"""
-    base_address_pt1a = 'http://www.electropedia.org/iev/iev.nsf/SearchView?'
-    base_address_pt1b = 'SearchView&Query=field+SearchFields+contains+'
-    base_address_pt2 = '+and+field+Language='
-    base_address_pt3 = '&SearchOrder=4&SearchMax=0'
+# NOTE: only table rows are needed from search results and entries
+ROWS = bs4.SoupStrainer("tr")
+
+
+def parse_id(html, search_term):
+    """get ID for specific term from search results"""
     ids = []
-    this_id = None
-    adapted_term = '%20'.join(search_term.split())
-    if source_lang in SOURCE_LANGS:
-        address = base_address_pt1a + base_address_pt1b + adapted_term + base_address_pt2 +\
-                  source_lang + base_address_pt3
-    else:
-        print("extract_electropedia: source language not supported")
-        sys.exit()
-    res = requests.get(address)
-    res.raise_for_status()
-    wordnet_soup = bs4.BeautifulSoup(res.text, features="html.parser")
+    wordnet_soup = bs4.BeautifulSoup(html, features="lxml", parse_only=ROWS)
     elems = wordnet_soup.select('tr > td > a')
     for elem in elems:
         parent = elem.find_parent('tr')
@@ -38,36 +42,168 @@ def get_id(search_term, source_lang):
         elem_name = parent.select('td > div')[0].getText().split(", ")[0]
         if elem_name == search_term:
             ids.append(elem_id)
-    if len(ids) == 1:
-        this_id = ids[0]
-    # NOTE: there may either be too many fits or zero fits so that this_id is returned as None
-    return this_id
+    # NOTE: there may either be too many fits or zero fits so that None is returned
+    return ids[0] if len(ids) == 1 else None
+
+
+def parse_translations(html):
+    """get translations of an entry for all languages available"""
+    translations = {}
+    wordnet_soup = bs4.BeautifulSoup(html, features="lxml", parse_only=ROWS)
+    for elem in wordnet_soup.select('tr'):
+        elem_lang = elem.select('td > div > font')
+        elem_text = elem.select('td:nth-of-type(3)')
+        if elem_lang and elem_text:
+            if elem_text[0].select('b'):
+                translation = elem_text[0].select('b')[0].getText().strip().split(',', 1)[0]
+            else:
+                translation = elem_text[0].getText().strip().split(',', 1)[0]
+            translations[elem_lang[0].getText()] = translation
+    return translations
+
+
+class ElectropediaClient:
+    """client w pooled connections, concurrent requests, and an sqlite cache for ids and translations"""
+
+    def __init__(self, base_url: str = BASE_URL, workers: int = WORKERS, timeout: float = TIMEOUT,
+                 cache_file: str = CACHE_FILE) -> None:
+        """ init
+
+        :param base_url: address of the iev database, may point to a local stand-in server
+        :param workers: maximum number of concurrent requests
+        :param timeout: timeout per request in seconds
+        :param cache_file: path to sqlite file; results are only kept for the current process if None
+        """
+        self.base_url: str = base_url.rstrip("/") + "/"
+        self.workers: int = workers
+        self.timeout: float = timeout
+        self.cache_file: str = cache_file
+        self.requests: int = 0
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._connection = None
+
+    def _connect(self):
+        """open sqlite cache lazily"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.cache_file or ":memory:", timeout=30)
+            if self.cache_file:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            # NOTE: terms and languages w/o a unique entry or translation are stored w an empty string
+            self._connection.execute("CREATE TABLE IF NOT EXISTS ids (term TEXT, lang TEXT, id TEXT, "
+                                     "PRIMARY KEY (term, lang))")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS translations (id TEXT, lang TEXT, "
+                                     "translation TEXT, PRIMARY KEY (id, lang))")
+            atexit.register(self.close)
+        return self._connection
+
+    def _fetch(self, address):
+        """get page via the pooled session"""
+        res = self.session.get(address, timeout=self.timeout)
+        res.raise_for_status()
+        return res.text
+
+    def _fetch_all(self, func, args):
+        """run func concurrently for all args w at most self.workers requests at once"""
+        self.requests += len(args)
+        if self.workers > 1 and len(args) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(func, args))
+        return [func(arg) for arg in args]
+
+    def _fetch_id(self, term_lang):
+        term, source_lang = term_lang
+        query = urllib.parse.quote(" ".join(term.split()))
+        address = self.base_url + 'SearchView?SearchView&Query=field+SearchFields+contains+' + query +\
+                  '+and+field+Language=' + source_lang + '&SearchOrder=4&SearchMax=0'
+        return parse_id(self._fetch(address), term)
+
+    def _fetch_translations(self, this_id):
+        address = self.base_url + 'display?openform&ievref=' + this_id
+        # webbrowser.get(using='google-chrome').open(address,new=2)
+        return parse_translations(self._fetch(address))
+
+    def get_ids(self, search_terms, source_lang):
+        """ get IDs for terms, only uncached terms are requested
+
+        :param search_terms: terms to look up
+        :param source_lang: language of the terms
+        :return: dict w terms as keys and IDs or None as values
+        """
+        if source_lang not in SOURCE_LANGS:
+            print("extract_electropedia: source language not supported")
+            sys.exit()
+        connection = self._connect()
+        ids = {}
+        for term in dict.fromkeys(search_terms):
+            row = connection.execute("SELECT id FROM ids WHERE term=? AND lang=?", (term, source_lang)).fetchone()
+            if row:
+                ids[term] = row[0] or None
+        new = [term for term in dict.fromkeys(search_terms) if term not in ids]
+        ids.update(zip(new, self._fetch_all(self._fetch_id, [(term, source_lang) for term in new])))
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO ids VALUES (?, ?, ?)",
+                                   [(term, source_lang, ids[term] or "") for term in new])
+        return ids
+
+    def get_translations(self, search_terms, source_lang, sink_lang):
+        """ get translations for terms, only uncached entries are requested
+
+        :param search_terms: terms to translate
+        :param source_lang: language of the terms
+        :param sink_lang: language to translate to
+        :return: list of translations or None in the order of search_terms
+        """
+        connection = self._connect()
+        ids = self.get_ids(search_terms, source_lang)
+        translations = {}
+        for this_id in set(filter(None, ids.values())):
+            row = connection.execute("SELECT translation FROM translations WHERE id=? AND lang=?",
+                                     (this_id, sink_lang)).fetchone()
+            if row:
+                translations[this_id] = row[0] or None
+        new = sorted(set(filter(None, ids.values())) - translations.keys())
+        entries = self._fetch_all(self._fetch_translations, new)
+        with connection:
+            for this_id, entry in zip(new, entries):
+                # NOTE: all languages of an entry are cached as they are contained in the same page
+                entry.setdefault(sink_lang, "")
+                connection.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?)",
+                                       [(this_id, lang, translation) for lang, translation in entry.items()])
+                translations[this_id] = entry[sink_lang] or None
+        return [translations.get(ids[term]) for term in search_terms]
+
+    def close(self) -> None:
+        """close sqlite cache and session"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self.session.close()
+
+    def cache_info(self) -> dict:
+        """return number of requests sent and of cached ids and entries"""
+        connection = self._connect()
+        return {"requests": self.requests,
+                "ids": connection.execute("SELECT COUNT(*) FROM ids").fetchone()[0],
+                "entries": connection.execute("SELECT COUNT(DISTINCT id) FROM translations").fetchone()[0]}
+
+
+CLIENT = ElectropediaClient()
+
+
+def get_id(search_term, source_lang):
+    """get ID for specific term"""
+    return CLIENT.get_ids([search_term], source_lang)[search_term]
 
 def get_translation(search_term, source_lang, sink_lang):
     """get translation for term with ID in specified language"""
-    base_address = 'http://www.electropedia.org/iev/iev.nsf/display?openform&ievref='
-    translation = None
-    id = get_id(search_term, source_lang)
-    if id:
-        address = base_address + id
-#    webbrowser.get(using='google-chrome').open(address,new=2)
-        res = requests.get(address)
-        res.raise_for_status()
-        wordnet_soup = bs4.BeautifulSoup(res.text, features="html.parser")
-        elems = wordnet_soup.select('tr')
-        for elem in elems:
-            elem_lang = elem.select('td > div > font')
-            if elem_lang:
-                l = elem_lang[0].getText()
-                if l == sink_lang:
-                    elem_text = elem.select('td:nth-of-type(3)')
-                    if elem_text[0].select('b'):
-                        translation = elem_text[0].select('b')[0].getText().strip().split(',', 1)[0]
-                    elif elem_text:
-                        translation = elem_text[0].getText().strip().split(',', 1)[0]
-    else:
-        translation = None
-    return translation
+    return CLIENT.get_translations([search_term], source_lang, sink_lang)[0]
+
+def get_translations(search_terms, source_lang, sink_lang):
+    """get translations for several terms concurrently"""
+    return CLIENT.get_translations(search_terms, source_lang, sink_lang)
 
 if __name__ == "__main__":
     print(get_translation("worm gear", "en", "fr"))
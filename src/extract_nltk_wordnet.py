@@ -3,10 +3,137 @@
 # NOTE: wordnet lemma names are returned with underscores for compound words
 # tokenizer may be used to resolve this if required
 
+import atexit
+import collections
+import functools
+import json
+import sqlite3
+import yaml
+
 from nltk.corpus import wordnet as wn
 
 POS = ["n", "v", "a", "r"]
 
+with open("config.yml", "r") as ymlfile:
+    cfg = yaml.safe_load(ymlfile)
+    CACHE_SIZE = cfg["settings"]["wordnet-cache"]["size"]
+    CACHE_FILE = cfg["settings"]["wordnet-cache"]["file"]
+
+
+class RelationCache:
+    """LRU cache for wordnet relations w optional persistent sqlite store"""
+
+    # NOTE: number of new entries after which the sqlite store is committed
+    _commit_interval = 1000
+
+    def __init__(self, maxsize: int = CACHE_SIZE, path: str = CACHE_FILE) -> None:
+        """ init
+
+        :param maxsize: maximum number of relations kept in memory
+        :param path: path to sqlite file for persisting relations across runs; memory only if None
+        """
+        self.maxsize: int = maxsize
+        self.path: str = path
+        self.entries: collections.OrderedDict = collections.OrderedDict()
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._connection = None
+        self._version: str = None
+        self._pending: int = 0
+
+    def lookup(self, relation: str, word: str, word_pos: str, func) -> list:
+        """ return related words from memory, from disk, or by calling func
+
+        :param relation: name of the wordnet relation
+        :param word: word for which related words are retrieved
+        :param word_pos: POS key
+        :param func: function querying wordnet, called w (word, word_pos) for misses
+        :return: list of related words
+        """
+        key = (relation, word, word_pos)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return list(self.entries[key])
+        words = self._load(key)
+        if words is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            words = func(word, word_pos)
+            self._store(key, words)
+        self._insert(key, words)
+        return list(words)
+
+    def _insert(self, key: tuple, words: list) -> None:
+        """insert into in-memory cache and evict least recently used entries"""
+        self.entries[key] = tuple(words)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _connect(self):
+        """open sqlite store lazily; entries are specific to the wordnet version"""
+        if self._connection is None:
+            self._version = wn.get_version()
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS relations (relation TEXT, word TEXT, "
+                                     "pos TEXT, version TEXT, words TEXT, "
+                                     "PRIMARY KEY (relation, word, pos, version))")
+            atexit.register(self.close)
+        return self._connection
+
+    def _load(self, key: tuple) -> list:
+        if not self.path:
+            return None
+        row = self._connect().execute("SELECT words FROM relations WHERE relation=? AND word=? AND pos=? "
+                                      "AND version=?", key + (self._version,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, key: tuple, words: list) -> None:
+        if not self.path:
+            return
+        self._connect().execute("INSERT OR REPLACE INTO relations VALUES (?, ?, ?, ?, ?)",
+                                key + (self._version, json.dumps(words)))
+        self._pending += 1
+        if self._pending >= self._commit_interval:
+            self._connection.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """commit pending entries and close sqlite store"""
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+            self._pending = 0
+
+    def clear(self) -> None:
+        """clear in-memory entries and reset counters; the sqlite store is kept"""
+        self.entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def cache_info(self) -> dict:
+        """return hit and miss counters"""
+        return {"hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize}
+
+
+CACHE = RelationCache()
+
+def cached(relation):
+    """memoize wordnet relation lookups via CACHE"""
+    def decorator(func):
+        @functools.wraps(func)
+        def cached_wrapper(word, word_pos):
+            return CACHE.lookup(relation, word, word_pos, func)
+        return cached_wrapper
+    return decorator
+
+@cached("syn")
 def get_syns(word, word_pos):
     """get synonyms from wordnet"""
     assert word_pos in POS, "invalid POS key"
@@ -16,6 +143,7 @@ def get_syns(word, word_pos):
     synonyms = list(dict.fromkeys(synonyms))
     return synonyms
 
+@cached("ant")
 def get_ants(word, word_pos):
     """get antonyms from wordnet"""
     assert word_pos in POS, "invalid POS key"
@@ -26,6 +154,7 @@ def get_ants(word, word_pos):
     antonyms = list(dict.fromkeys(antonyms))
     return antonyms
 
+@cached("hypo")
 def get_hypos(word, word_pos):
     """get hyponyms from wordnet"""
     assert word_pos in POS, "invalid POS key"
@@ -37,6 +166,7 @@ def get_hypos(word, word_pos):
     hyponyms = list(dict.fromkeys(hyponyms))
     return hyponyms
 
+@cached("hype")
 def get_hypes(word, word_pos):
     """get hypernyms from wordnet"""
     assert word_pos in POS, "invalid POS key"
@@ -48,6 +178,7 @@ def get_hypes(word, word_pos):
     hypernyms = list(dict.fromkeys(hypernyms))
     return hypernyms
 
+@cached("drv")
 def get_derivationally_related_verbs(word, word_pos):
     """get derivationally related verbs for noun, e.g., 'precede' for 'predecessor'"""
     assert word_pos == "n", "invalid POS key"
@@ -73,3 +204,4 @@ if __name__ == "__main__":
                 print("-" * 10)
             print(f + " for " + word + " are:")
             print(*elems, sep="\n")
+    print(CACHE.cache_info())
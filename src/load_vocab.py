@@ -4,6 +4,8 @@
 import csv
 import yaml
 
+from collections import defaultdict
+
 with open("config.yml", "r") as ymlfile:
     cfg = yaml.safe_load(ymlfile)
     VOCAB = cfg["inputs"]["vocab"]
@@ -18,6 +20,44 @@ def csv_to_nested_list(vocab=VOCAB):
         synsets = None
     return synsets
 
+class DomainVocabulary:
+    """synsets from domain specific vocabulary indexed by term"""
+
+    def __init__(self, synsets: list) -> None:
+        """ init
+
+        :param synsets: nested list with synsets as returned by csv_to_nested_list
+        """
+        self.synsets: list = synsets
+        self.index: dict = defaultdict(set)
+        # NOTE: identical rows are treated as the same synset
+        synset_ids: dict = {}
+        for synset in synsets:
+            synset_id = synset_ids.setdefault(tuple(synset), len(synset_ids))
+            for term in synset:
+                self.index[term].add(synset_id)
+
+    def get_synset_ids(self, term: str) -> set:
+        """return ids of all synsets the term is part of"""
+        return self.index.get(term, set())
+
+    def in_same_synset(self, term1: str, term2: str) -> bool:
+        """check if both terms are part of a common synset"""
+        return not self.get_synset_ids(term1).isdisjoint(self.get_synset_ids(term2))
+
+    def in_different_synsets(self, term1: str, term2: str) -> bool:
+        """check if the terms are part of two synsets that differ from each other"""
+        ids1 = self.get_synset_ids(term1)
+        ids2 = self.get_synset_ids(term2)
+        return bool(ids1) and bool(ids2) and not (len(ids1) == len(ids2) == 1 and ids1 == ids2)
+
+def load_vocabulary(vocab=VOCAB):
+    """read csv and return indexed vocabulary, None if no vocabulary is specified"""
+    synsets = csv_to_nested_list(vocab)
+    if synsets is None:
+        return None
+    return DomainVocabulary(synsets)
+
 if __name__ == "__main__":
     synsets = csv_to_nested_list()
     if type(synsets) == list:
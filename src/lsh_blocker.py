@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+blocking via MinHash signatures and locality sensitive hashing (LSH)
+elements are represented as token sets, e.g., character shingles of names; two elements
+become a candidate pair if their signatures agree in all rows of at least one band
+the probability for this is 1-(1-s^rows)^bands for a Jaccard similarity s, i.e., more
+rows make blocking stricter and more bands increase recall
+"""
+
+import zlib
+import numpy as np
+from collections import defaultdict
+
+
+class LshBlocker:
+    """candidate pairs of elements w similar token sets via MinHash and LSH banding"""
+
+    # NOTE: Mersenne prime for universal hashing of 32 bit token hashes
+    _prime = (1 << 61) - 1
+
+    def __init__(self, bands: int, rows: int, seed: int = 0) -> None:
+        """ init
+
+        :param bands: number of bands the signatures are split into
+        :param rows: number of signature rows per band
+        :param seed: seed for the hash functions, fixed for reproducible candidates
+        """
+        self.bands: int = bands
+        self.rows: int = rows
+        rng = np.random.RandomState(seed)
+        self.coeff_a: np.ndarray = rng.randint(1, 1 << 32, size=bands * rows, dtype=np.uint64)
+        self.coeff_b: np.ndarray = rng.randint(0, 1 << 32, size=bands * rows, dtype=np.uint64)
+
+    @staticmethod
+    def shingles(string: str, size: int) -> set:
+        """ character shingles of a string; strings shorter than size are a single shingle
+
+        :param string: string to be split
+        :param size: number of characters per shingle
+        :return: set of shingles
+        """
+        if len(string) <= size:
+            return {string} if string else set()
+        return {string[i:i + size] for i in range(len(string) - size + 1)}
+
+    def signature(self, tokens: set) -> np.ndarray:
+        """ MinHash signature of a token set
+
+        :param tokens: set of strings
+        :return: signature w bands*rows entries, None for empty token sets
+        """
+        if not tokens:
+            return None
+        hashes = np.array([zlib.crc32(token.encode("utf-8")) for token in tokens], dtype=np.uint64)
+        # NOTE: a*x+b does not overflow as all of a, b, and x are below 2^32
+        return ((np.outer(hashes, self.coeff_a) + self.coeff_b) % np.uint64(self._prime)).min(axis=0)
+
+    def _buckets(self, token_sets: list) -> dict:
+        """ assign elements to buckets per band
+
+        :param token_sets: token set per element
+        :return: dict w (band, band signature) as keys and lists of element positions as values
+        """
+        buckets: dict = defaultdict(list)
+        for pos, tokens in enumerate(token_sets):
+            sig = self.signature(tokens)
+            if sig is None:
+                continue
+            for band in range(self.bands):
+                buckets[(band, sig[band * self.rows:(band + 1) * self.rows].tobytes())].append(pos)
+        return buckets
+
+    def candidate_pairs(self, token_sets_1: list, token_sets_2: list) -> set:
+        """ find pairs of elements from two lists that share a bucket in at least one band
+
+        :param token_sets_x: token set per element
+        :return: set of candidate pairs as tuples of positions in the two lists
+        """
+        buckets_1 = self._buckets(token_sets_1)
+        buckets_2 = self._buckets(token_sets_2)
+        candidates: set = set()
+        for key, positions_1 in buckets_1.items():
+            for pos1 in positions_1:
+                candidates.update((pos1, pos2) for pos2 in buckets_2.get(key, []))
+        return candidates
+
+
+if __name__ == "__main__":
+    names1 = ["engine_v8", "gearbox_manual", "brake_disc_front", "seat"]
+    names2 = ["engine_v6", "gearbox_automatic", "brake_disc_rear", "steering_wheel"]
+    for bands, rows in (4, 2), (8, 4), (16, 8):
+        blocker = LshBlocker(bands, rows)
+        pairs = blocker.candidate_pairs([blocker.shingles(n, 3) for n in names1],
+                                        [blocker.shingles(n, 3) for n in names2])
+        print(f"{bands} bands, {rows} rows: {sorted((names1[p[0]], names2[p[1]]) for p in pairs)}")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+process-wide registry of MarianMT translation models
+models are loaded on first use per language pair; the most recently used models are kept
+resident as long as they fit the configured number of models and memory budget
+"""
+
+import collections
+import gc
+import timeit
+import torch
+import yaml
+
+from transformers import MarianTokenizer, MarianMTModel
+
+with open("config.yml", "r") as ymlfile:
+    cfg = yaml.safe_load(ymlfile)
+    MAX_MODELS = cfg["settings"]["translation"]["max-models"]
+    MEMORY_BUDGET = cfg["settings"]["translation"]["memory-budget"]
+    QUANTIZE = cfg["settings"]["translation"]["quantize"]
+    THREADS = cfg["settings"]["translation"]["threads"]
+
+if THREADS:
+    torch.set_num_threads(THREADS)
+
+
+def get_model_name(src: str, trg: str) -> str:
+    """name of the huggingface MarianMT model for a language pair"""
+    return f'Helsinki-NLP/opus-mt-{src}-{trg}'
+
+
+def get_tensor_size(value) -> int:
+    """ size of tensors in bytes, nested tuples and lists are traversed, e.g., the packed
+    weight and bias of quantized linear layers; other values, e.g., dtypes, are ignored
+    """
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(get_tensor_size(v) for v in value)
+    return 0
+
+
+def inference_context():
+    """context for running models w/o autograd; torch.inference_mode requires torch>=1.9"""
+    if hasattr(torch, "inference_mode"):
+        return torch.inference_mode()
+    return torch.no_grad()
+
+
+class LoadedModel:
+    """MarianMT model and tokenizer w load statistics"""
+
+    def __init__(self, name: str, quantize: bool = False) -> None:
+        """ load model and tokenizer
+
+        :param name: name of the huggingface model
+        :param quantize: apply dynamic int8 quantization to the linear layers for CPU inference
+        """
+        tic = timeit.default_timer()
+        self.name: str = name
+        self.quantize: bool = quantize
+        self.model = MarianMTModel.from_pretrained(name).eval()
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.tokenizer = MarianTokenizer.from_pretrained(name)
+        self.load_time: float = timeit.default_timer() - tic
+        # NOTE: quantized weights are not exposed as parameters, hence the state dict is used
+        self.size: int = get_tensor_size(list(self.model.state_dict().values()))
+        self.uses: int = 0
+
+
+class ModelRegistry:
+    """LRU cache of loaded translation models"""
+
+    def __init__(self, max_models: int = MAX_MODELS, memory_budget: float = MEMORY_BUDGET) -> None:
+        """ init
+
+        :param max_models: maximum number of resident models
+        :param memory_budget: maximum size of all resident models in MB, the most recently
+            used model is kept even if it exceeds the budget on its own
+        """
+        self.max_models: int = max_models
+        self.memory_budget: float = memory_budget
+        self.entries: collections.OrderedDict = collections.OrderedDict()
+
+    def get(self, src: str, trg: str, quantize: bool = QUANTIZE) -> LoadedModel:
+        """ return model for a language pair, load it if it is not resident
+
+        :param src: source language
+        :param trg: target language
+        :param quantize: use the dynamically quantized int8 variant of the model
+        :return: loaded model incl. its tokenizer
+        """
+        key = (get_model_name(src, trg), quantize)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        else:
+            loaded = LoadedModel(key[0], quantize)
+            print(f"loaded {key[0]}{' (int8)' if quantize else ''} in {loaded.load_time:.1f} s, "
+                  f"{loaded.size / 2**20:.0f} MB")
+            self.entries[key] = loaded
+            self._evict()
+        self.entries[key].uses += 1
+        return self.entries[key]
+
+    def resident_size(self) -> int:
+        """total size of resident models in bytes"""
+        return sum(loaded.size for loaded in self.entries.values())
+
+    def _evict(self) -> None:
+        """remove least recently used models until the limits are met"""
+        evicted = False
+        while len(self.entries) > 1 and (len(self.entries) > self.max_models or
+                                         self.resident_size() > self.memory_budget * 2**20):
+            self.entries.popitem(last=False)
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def model_info(self) -> list:
+        """return load time, size in MB, and number of uses per resident model"""
+        return [{"model": loaded.name,
+                 "int8": loaded.quantize,
+                 "load_time": round(loaded.load_time, 2),
+                 "size_mb": round(loaded.size / 2**20, 1),
+                 "uses": loaded.uses} for loaded in self.entries.values()]
+
+
+REGISTRY = ModelRegistry()
@@ -20,6 +20,8 @@ from owlready2 import sync_reasoner_pellet, sync_reasoner_hermit, Thing, Nothing
                       TransitiveProperty, SymmetricProperty, AsymmetricProperty,\
                       ReflexiveProperty, IrreflexiveProperty, Restriction
 
+import onto_registry as reg
+
 
 LOGFILE = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")+"_debugger.log"
 logging.basicConfig(filename=LOGFILE, level=logging.DEBUG)
@@ -53,11 +55,13 @@ class OntoDebugger:
         onto_path.extend(list(set([path.rsplit("/", 1)[0]]) - set(onto_path)))
         if import_paths:
             onto_path.extend(list(set(import_paths) - set(onto_path)))
-        self.onto_world = World()
         try:
-            self.onto = self.onto_world.get_ontology(self.path).load()
+            loaded = reg.REGISTRY.get(self.path)
+            self.onto_world = loaded.world
+            self.onto = loaded.onto
             self.logger.info("successfully loaded ontology specified")
         except:
+            self.onto_world = World()
             self.onto = self.onto_world.get_ontology(self.iri)
             self.onto.save(file = self.path)
             self.logger.info("ontology file did not exist - created a new one")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+process-wide registry of loaded ontologies so that each input file is only parsed once
+entries are keyed by the local file and its modification time, i.e., ontologies are
+reloaded automatically once the file has been changed, e.g., after translation
+NOTE: worlds provided are shared - use a separate World for modifications that are not saved
+"""
+
+import os
+from owlready2 import World
+
+
+class LoadedOnto:
+    """ontology loaded into its own world w lazily created rdflib graph view"""
+
+    def __init__(self, path: str) -> None:
+        """ load ontology into new world
+
+        :param path: path to ontology file or URL
+        """
+        self.path: str = path
+        self.world: World = World()
+        self.onto = self.world.get_ontology(path).load()
+        self._graph = None
+
+    @property
+    def graph(self):
+        """rdflib graph view of the world"""
+        if self._graph is None:
+            self._graph = self.world.as_rdflib_graph()
+        return self._graph
+
+
+class OntoRegistry:
+    """cache loaded ontologies per file and file version"""
+
+    def __init__(self) -> None:
+        self.entries: dict = {}
+        self.loads: int = 0
+        self.hits: int = 0
+
+    @staticmethod
+    def _get_key(path: str) -> tuple:
+        """ identify file and its version; paths that do not point to local files,
+        e.g., URLs, are identified by the path only
+
+        :param path: path as used by owlready2, may include the file:// prefix
+        :return: tuple of normalized path and file version
+        """
+        local_path = path[len("file://"):] if path.startswith("file://") else path
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return path, None
+        return os.path.abspath(local_path), (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path: str) -> LoadedOnto:
+        """ return loaded ontology, load it if it is not available in its current version
+
+        :param path: path to ontology file or URL
+        :return: loaded ontology incl. its world
+        """
+        key, version = self._get_key(path)
+        entry = self.entries.get(key)
+        if entry and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        loaded = LoadedOnto(path)
+        self.loads += 1
+        self.entries[key] = (version, loaded)
+        return loaded
+
+    def get_world(self, path: str) -> World:
+        return self.get(path).world
+
+    def get_ontology(self, path: str):
+        return self.get(path).onto
+
+    def query(self, path: str, query: str) -> list:
+        """query onto via rdflib and return results as list"""
+        return list(self.get(path).graph.query(query))
+
+    def invalidate(self, path: str = None) -> None:
+        """ remove an ontology from the registry, remove all if no path is specified
+
+        :param path: path to ontology file or URL
+        """
+        if path is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(self._get_key(path)[0], None)
+
+
+REGISTRY = OntoRegistry()
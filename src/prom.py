@@ -20,6 +20,10 @@ import baseline_string_matcher as bsm
 import onto_debugger as odb
 import alignment_selector as als
 import abox_matcher as am
+import extract_nltk_wordnet as extr
+import extract_electropedia as ee
+import translation_memory as trm
+import model_registry as mtr
 
 from owlready2 import onto_path
 
@@ -81,6 +85,12 @@ class Prom:
             to.main(path[0], path[1], path[2], self.default_lang, path[3])
             if self.verbose:
                 print("----")
+        if self.verbose:
+            print(f"translation memory: {trm.MEMORY.cache_info()}")
+            print(f"translation models: {mtr.REGISTRY.model_info()}")
+            print(f"electropedia: {ee.CLIENT.cache_info()}")
+            print(f"language detection: {to.detect_language.cache_info()}")
+            print(f"spellchecking: {to.spellcheck.cache_info()}")
 
 
     def match_tbox(self) -> list:
@@ -105,6 +115,7 @@ class Prom:
         #                 'http://www.ohio.edu/ontologies/manufacturing-capability#Drilling', 'disjoint', 0.9])
 
         if self.verbose:
+            print(f"wordnet cache: {extr.CACHE.cache_info()}")
             print(f"all {len(matches)} potential matches are:")
             print(*matches, sep="\n")
         # auto_accepted_matches = sb.check_boundary(matches, 4, self.match_boundary)
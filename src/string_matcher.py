@@ -4,9 +4,17 @@ string matcher
 """
 
 import itertools as it
+import numpy as np
+from collections import Counter, defaultdict
 from Levenshtein import distance as levenshtein_dist
+from rapidfuzz.distance import Levenshtein as rf_levenshtein
+from rapidfuzz.process import cdist
+from scipy.sparse import csr_matrix
 import alignment_selector as sel
 
+# NOTE: maximum number of scores held in memory at once when matching blocked w rapidfuzz
+TILE_SIZE = 2**22
+
 
 class StringMatcher:
     def __init__(self, list1: list, list2: list, pos1: int, pos2: int, threshold: float) -> None:
@@ -24,19 +32,158 @@ class StringMatcher:
         self.pos2: int = pos2
         self.threshold: float = threshold
         self.matches: list = []
+        self.scores = None
         self.optimal_combination: list = []
         self.score: float = None
 
-    def match_lists(self) -> None:
-        """calculate similarity for all combinations of elements from two lists"""
-        for combo in list(it.product(self.list1, self.list2)):
+    def match_lists(self, blocked: bool = False, q: int = 2, backend: str = "python", workers: int = -1) -> None:
+        """ calculate similarity for all combinations of elements from two lists
+
+        :param blocked: only score pairs that may exceed the threshold, cp. _match_lists_blocked
+        :param q: length of the q-grams used for blocking, only relevant for the python backend
+        :param backend: python - score pairs individually; rapidfuzz - score the entire
+            similarity matrix in native code, cp. _match_lists_matrix
+        :param workers: number of threads used by the rapidfuzz backend, -1 uses all cores
+        """
+        if backend == "rapidfuzz":
+            self._match_lists_matrix(blocked, workers)
+            return
+        if backend != "python":
+            raise ValueError(f"invalid backend {backend} - should be one of ['python', 'rapidfuzz']")
+        if blocked:
+            self._match_lists_blocked(q)
+            return
+        for combo in it.product(self.list1, self.list2):
             self.matches.append((combo[0], combo[1], self.norm_levenshtein_dist(combo[0][self.pos1], combo[1][self.pos2])))
 
+    def match_pairs(self, pairs: list, backend: str = "python") -> None:
+        """ calculate similarity for given combinations of elements from two lists,
+        e.g., candidates from blocking
+
+        :param pairs: combinations as tuples of positions in list1 and list2
+        :param backend: python or rapidfuzz, cp. match_lists
+        """
+        if backend == "rapidfuzz":
+            similarity = rf_levenshtein.normalized_similarity
+        elif backend == "python":
+            similarity = self.norm_levenshtein_dist
+        else:
+            raise ValueError(f"invalid backend {backend} - should be one of ['python', 'rapidfuzz']")
+        for pos1, pos2 in pairs:
+            elem1, elem2 = self.list1[pos1], self.list2[pos2]
+            self.matches.append((elem1, elem2, similarity(elem1[self.pos1], elem2[self.pos2])))
+
+    def _match_lists_blocked(self, q: int) -> None:
+        """ calculate similarity for those combinations of elements from two lists that
+        may exceed the threshold; only these are stored, in the same order as for match_lists
+        candidates are restricted via the string lengths, as the distance is at least the
+        difference in length, and via the number of shared q-grams, as each edit operation
+        affects at most q q-grams
+
+        :param q: length of the q-grams used for blocking
+        """
+        strings2 = [e[self.pos2] for e in self.list2]
+        by_length: dict = defaultdict(list)
+        postings: dict = defaultdict(list)
+        for pos, string in enumerate(strings2):
+            by_length[len(string)].append(pos)
+            for gram, count in self._qgrams(string, q).items():
+                postings[(len(string), gram)].append((pos, count))
+        lengths = sorted(by_length)
+        for elem1 in self.list1:
+            string1 = elem1[self.pos1]
+            grams1 = self._qgrams(string1, q)
+            candidates: list = []
+            for length in lengths:
+                longest = max(len(string1), length)
+                max_dist = self._max_distance(longest)
+                if abs(len(string1) - length) > max_dist:
+                    continue
+                min_shared = longest - q + 1 - max_dist * q
+                if min_shared <= 0:
+                    candidates.extend(by_length[length])
+                    continue
+                shared: dict = defaultdict(int)
+                for gram, count in grams1.items():
+                    for pos, count2 in postings.get((length, gram), []):
+                        shared[pos] += min(count, count2)
+                candidates.extend(pos for pos, count in shared.items() if count >= min_shared)
+            for pos in sorted(candidates):
+                rating = self.norm_levenshtein_dist(string1, strings2[pos])
+                if rating > self.threshold:
+                    self.matches.append((elem1, self.list2[pos], rating))
+
+    def _match_lists_matrix(self, blocked: bool, workers: int, tile_size: int = TILE_SIZE) -> None:
+        """ calculate the normalized similarity matrix for both lists in native code
+        across several threads and store it in self.scores; in blocked mode, the matrix is
+        calculated in chunks of rows and only entries and matches exceeding the threshold
+        are stored, self.scores is then a sparse matrix
+
+        :param blocked: only store matches exceeding the threshold
+        :param workers: number of threads, -1 uses all cores
+        :param tile_size: maximum number of scores calculated at once in blocked mode
+        """
+        strings1 = [e[self.pos1] for e in self.list1]
+        strings2 = [e[self.pos2] for e in self.list2]
+        if not blocked:
+            self.scores = cdist(strings1, strings2, scorer=rf_levenshtein.normalized_similarity,
+                                dtype=np.float64, workers=workers)
+            self.matches.extend((self.list1[r], self.list2[c], float(self.scores[r, c]))
+                                for r, c in it.product(range(len(self.list1)), range(len(self.list2))))
+            return
+        # NOTE: the cutoff is slightly below the threshold as rapidfuzz may set scores that exceed
+        # the threshold by floating point error only to 0, e.g., 1-7/10 for a threshold of .3
+        cutoff = max(0., self.threshold - 1e-6)
+        chunk = max(1, tile_size // max(1, len(strings2)))
+        rows, cols, ratings = [], [], []
+        for start in range(0, len(strings1), chunk):
+            scores = cdist(strings1[start:start + chunk], strings2, scorer=rf_levenshtein.normalized_similarity,
+                           dtype=np.float64, score_cutoff=cutoff, workers=workers)
+            chunk_rows, chunk_cols = np.nonzero(scores > self.threshold)
+            rows.append(chunk_rows + start)
+            cols.append(chunk_cols)
+            ratings.append(scores[chunk_rows, chunk_cols])
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        ratings = np.concatenate(ratings) if ratings else np.zeros(0)
+        self.scores = csr_matrix((ratings, (rows, cols)), shape=(len(strings1), len(strings2)))
+        self.matches.extend((self.list1[r], self.list2[c], rating)
+                            for r, c, rating in zip(rows.tolist(), cols.tolist(), ratings.tolist()))
+
+    def _max_distance(self, longest: int) -> int:
+        """ maximum levenshtein distance for which the normalized similarity of strings
+        w the maximum length longest exceeds the threshold; -1 if there is none
+
+        :param longest: length of the longer string
+        :return: maximum distance
+        """
+        if longest == 0:
+            return 0
+        dist = min(longest, int((1 - self.threshold) * longest) + 2)
+        while dist >= 0 and not 1 - dist / longest > self.threshold:
+            dist -= 1
+        return dist
+
+    @staticmethod
+    def _qgrams(string: str, q: int) -> Counter:
+        """count the substrings of length q"""
+        return Counter(string[i:i + q] for i in range(len(string) - q + 1))
+
     def calc_alignment(self, method: str) -> None:
-        selector = sel.AlignmentSelector(self.threshold, self.matches, uid1_pos=0, uid2_pos=1)
-        selector.optimize_combination(method)
-        self.optimal_combination = selector.optimal_combination
-        self.score = selector.overall_score(selector.optimal_combination)
+        """ select matches; if the similarity matrix is available, it is passed to the
+        selector directly
+
+        :param method: selection method, cp. AlignmentSelector.optimize_combination
+        """
+        if self.scores is not None:
+            selector = sel.AlignmentSelector(self.threshold, [], uid1_pos=0, uid2_pos=1)
+            selection = selector.optimize_matrix(self.scores, method)
+            self.optimal_combination = [(self.list1[r], self.list2[c], rating) for r, c, rating in selection]
+        else:
+            selector = sel.AlignmentSelector(self.threshold, self.matches, uid1_pos=0, uid2_pos=1)
+            selector.optimize_combination(method)
+            self.optimal_combination = selector.optimal_combination
+        self.score = selector.overall_score(self.optimal_combination)
 
     @staticmethod
     def norm_levenshtein_dist(str1: str, str2: str) -> float:
@@ -57,7 +204,17 @@ if __name__ == "__main__":
     matcher = StringMatcher(lst1, lst2, -1, -1, .6)
     matcher.match_lists()
     print(f"matches are:\n{matcher.matches}")
-    for mtype in "greedy", "optimal_sc", "optimal_mc":
+    blocked_matcher = StringMatcher(lst1, lst2, -1, -1, .6)
+    blocked_matcher.match_lists(blocked=True)
+    print(f"matches exceeding the threshold are:\n{blocked_matcher.matches}")
+    for mtype in "greedy", "optimal_sc", "optimal_mc", "optimal_lsa":
         matcher.calc_alignment(mtype)
         print(f"{mtype} matches: {matcher.optimal_combination}")
         print(f"score: {matcher.score}")
+    matrix_matcher = StringMatcher(lst1, lst2, -1, -1, .6)
+    matrix_matcher.match_lists(blocked=True, backend="rapidfuzz")
+    print(f"similarity matrix:\n{matrix_matcher.scores.toarray()}")
+    for mtype in "greedy", "optimal_lsa":
+        matrix_matcher.calc_alignment(mtype)
+        print(f"{mtype} matches: {matrix_matcher.optimal_combination}")
+        print(f"score: {matrix_matcher.score}")
@@ -5,6 +5,7 @@ explicitly supported languages are [en, fr, de], should also work with other lan
 if specified by user and if the input is English, run spellchecker
 """
 
+import functools
 import re
 import spacy
 import sys
@@ -14,35 +15,60 @@ import googletrans as gt
 import spelchek
 
 import extract_electropedia as ee
+import model_registry as mtr
+import onto_registry as reg
+import translation_memory as trm
 
-from langdetect import detect
-from owlready2 import get_ontology, IRIS, locstr, World
+from collections import Counter, defaultdict
+from langdetect import detect, DetectorFactory
+from owlready2 import IRIS, locstr
+from rdflib import BNode
 from spacy.matcher import Matcher
-from transformers import MarianTokenizer, MarianMTModel
 from translate import Translator
 from typing import List
 
 NLP = spacy.load("en_core_web_sm")
-GTRANS = gt.Translator()
-
-# preload huggingface MarianMT models
-DE_EN_model = MarianMTModel.from_pretrained('Helsinki-NLP/opus-mt-de-en')
-DE_EN_tok = MarianTokenizer.from_pretrained('Helsinki-NLP/opus-mt-de-en')
-FR_EN_model = MarianMTModel.from_pretrained('Helsinki-NLP/opus-mt-fr-en')
-FR_EN_tok = MarianTokenizer.from_pretrained('Helsinki-NLP/opus-mt-fr-en')
 
 with open("config.yml", "r") as ymlfile:
     cfg = yaml.safe_load(ymlfile)
     DEFAULT_LANG = cfg["settings"]["default-language"]
     DOMAIN_DICT = cfg["settings"]["domain-specific-dict"]
     SPELLCHECK = cfg["settings"]["spellchecking"]
+    SPACY_BATCH_SIZE = cfg["settings"]["spacy"]["batch-size"]
+    BATCH_SIZE = cfg["settings"]["translation"]["batch-size"]
+    MAX_TOKENS = cfg["settings"]["translation"]["max-tokens"]
+    NUM_BEAMS = cfg["settings"]["translation"]["num-beams"]
+    LANG_SEED = cfg["settings"]["language-detection"]["seed"]
+    NAMESPACE_VOTE = cfg["settings"]["language-detection"]["namespace-vote"]
+
+# NOTE: langdetect is non-deterministic unless seeded
+DetectorFactory.seed = LANG_SEED
+
+ELEM_TYPES = ["owl:Class", "owl:ObjectProperty", "owl:DatatypeProperty"]
+
+# matchers for extracting relevant POS from labels
+# NOTE: add 'DEP':'advmod' and 'DEP':'amod' for further restrictions
+LABEL_MATCHERS = {elem_type: Matcher(NLP.vocab) for elem_type in ELEM_TYPES}
+LABEL_MATCHERS["owl:Class"].add("class_matcher", None,
+                                [{'POS':'ADV','OP':'*'},{'POS':'ADJ','OP':'*'},{'POS':'VERB','OP':'*'},
+                                 {'POS':'PROPN', 'OP':'*'},{'POS':'NOUN','OP':'+'}])
+# NOTE: the second op pattern catches cases of misclassification such as "lower"
+LABEL_MATCHERS["owl:ObjectProperty"].add("op_matcher", None,
+                                         [{'POS':'AUX','OP':'*'},{'POS':'ADV','OP':'*'},{'POS':'VERB'},
+                                          {'POS':'ADP','OP':'*'}],
+                                         [{'POS':'ADJ'}])
+LABEL_MATCHERS["owl:DatatypeProperty"].add("dp_matcher", None,
+                                           [{'POS':'ADV','DEP':'advmod','OP':'*'},{'POS':'ADJ','DEP':'amod','OP':'*'},
+                                            {'POS':'NOUN'}],
+                                           [{'POS':'ADV','OP':'*'},{'POS':'ADJ','OP':'*'},{'POS':'PROPN'}])
 
-def create_query(iri, element_type):
-    """SPARQL query to extract classes, labels, and language tags"""
+def create_query(iri, element_types=ELEM_TYPES):
+    """SPARQL query to extract elements of the types specified, their labels, and language tags"""
     query = """PREFIX owl: <http://www.w3.org/2002/07/owl#>
         PREFIX : <""" + iri + """#>
-        SELECT DISTINCT ?elem ?label ?language WHERE {
-        ?elem a """ + element_type + """ . 
+        SELECT DISTINCT ?elem ?type ?label ?language WHERE {
+        VALUES ?type { """ + " ".join(element_types) + """ }
+        ?elem a ?type . 
         OPTIONAL {
             ?elem rdfs:label ?label . 
             BIND ( lang(?label) AS ?language ) . 
@@ -52,13 +78,27 @@ def create_query(iri, element_type):
     return query
 
 def query_onto(path, query):
-    """query onto and return results as list - onto must be already loaded"""
-    my_world = World()
-    onto = my_world.get_ontology(path).load()
-    graph = my_world.as_rdflib_graph()
-    results = list(graph.query(query))
+    """query onto and return results as list - onto is loaded via the registry"""
+    results = reg.REGISTRY.query(path, query)
     return results
 
+def get_elems_to_label(rows, target_lang):
+    """
+    group query results by element and language in a single pass and select the elements
+    w/o a label in target_lang
+    :param rows: query results of the form (elem, type, label, language) sorted by elem and language
+    :return: list of tuples of elem and elem type, elem is a tuple of (elem, label, language)
+        of the first label, i.e., multiple labels are not prioritized yet
+    """
+    labels = defaultdict(dict)
+    for elem, elem_type, label, language in rows:
+        if isinstance(elem, BNode):
+            continue
+        labels[(elem, "owl:" + reduce_to_class(str(elem_type)))]\
+            .setdefault(str(language or ""), []).append((elem, label, language))
+    return [(next(iter(labels_by_lang.values()))[0], elem_type)
+            for (elem, elem_type), labels_by_lang in labels.items() if target_lang not in labels_by_lang]
+
 def reduce_to_class(elem):
     """return only actual class name"""
     # NOTE: assumes that # is used to separate entity name from onto name
@@ -66,25 +106,46 @@ def reduce_to_class(elem):
 
 def huggingface_translate(text, src, trg):
     """translate text using the huggingface translator"""
-    # NOTE: German and French language models are globally preloaded to improve performance
-    if src == "de" and trg == "en":
-        model = DE_EN_model
-        tok = DE_EN_tok
-    elif src == "fr" and trg == "en":
-        model = FR_EN_model
-        tok = FR_EN_tok
-    else:
-        mname = f'Helsinki-NLP/opus-mt-{src}-{trg}'
-        model = MarianMTModel.from_pretrained(mname)
-        tok = MarianTokenizer.from_pretrained(mname)
-    translated = model.generate(**tok(text, return_tensors="pt", padding=True), max_new_tokens=20)
-    tgt_text = [tok.decode(t, skip_special_tokens=True) for t in translated]
-    return tgt_text[0]
+    return huggingface_translate_batch([text], src, trg)[0]
+
+def huggingface_translate_batch(texts, src, trg, batch_size=BATCH_SIZE, max_tokens=MAX_TOKENS,
+                                num_beams=NUM_BEAMS, quantize=mtr.QUANTIZE):
+    """
+    translate texts using the huggingface translator
+    texts are sorted by length and translated in mini-batches to reduce padding
+    :param batch_size: number of texts per call of generate
+    :param max_tokens: maximum number of tokens generated per text
+    :param num_beams: 1 for greedy decoding, None for the model's default beam search
+    :param quantize: use the dynamically quantized int8 model
+    :return: list of translations in the order of texts
+    """
+    if not texts:
+        return []
+    # NOTE: models are loaded on first use and kept resident by the model registry
+    loaded = mtr.REGISTRY.get(src, trg, quantize)
+    model = loaded.model
+    tok = loaded.tokenizer
+    decoding = {"num_beams": num_beams} if num_beams else {}
+    order = sorted(range(len(texts)), key=lambda pos: len(texts[pos]))
+    translations = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        positions = order[start:start + batch_size]
+        batch = tok([texts[pos] for pos in positions], return_tensors="pt", padding=True)
+        with mtr.inference_context():
+            translated = model.generate(**batch, max_new_tokens=max_tokens, **decoding)
+        for pos, t in zip(positions, translated):
+            translations[pos] = tok.decode(t, skip_special_tokens=True)
+    return translations
+
+@functools.lru_cache(maxsize=None)
+def get_google_translator():
+    """create googletrans translator on first use"""
+    return gt.Translator()
 
 def translate_w_google(text, source, sink):
     """translate a word using the googletrans package"""
     # NOTE: does not work reliably
-    translation = GTRANS.translate(text, dest=sink, src=source).text
+    translation = get_google_translator().translate(text, dest=sink, src=source).text
     print(translation)
     time.sleep(1)
     return translation
@@ -97,6 +158,15 @@ def translate(text, source, sink):
 
 def two_stage_translate(text, src, trg, translator="hf"):
     """try translating via domain-specific dict first, otherwise default to translator"""
+    return two_stage_translate_batch([text], src, trg, translator)[0]
+
+def two_stage_translate_batch(texts, src, trg, translator="hf"):
+    """
+    try translating via domain-specific dict first, otherwise default to translator
+    the translation memory is consulted before both, the huggingface translator processes
+    all remaining texts at once
+    :return: list of translations in the order of texts
+    """
     funcs = {"hf": huggingface_translate,
              "twg": translate_w_google,
              "t": translate}
@@ -105,103 +175,179 @@ def two_stage_translate(text, src, trg, translator="hf"):
     except KeyError:
         print("unknown translator", translator)
         sys.exit(1)
+    # NOTE: translations depend on whether the domain-specific dict is used
+    backend = f"iec-{translator}" if DOMAIN_DICT else translator
+    model = ""
+    if translator == "hf":
+        # NOTE: quantization and decoding may change translations
+        model = f"{mtr.get_model_name(src, trg)}:{'int8' if mtr.QUANTIZE else 'fp32'}:beams={NUM_BEAMS}"
+    memorized = trm.MEMORY.lookup(texts, src, trg, backend, model)
+    translations = [memorized.get(text) for text in texts]
+    new = [pos for pos, translation in enumerate(translations) if translation is None]
     if DOMAIN_DICT:
-        translation = ee.get_translation(text, str(src), str(trg))
-    if not DOMAIN_DICT or not translation:
-        translation = func(text, src, trg)
-    return translation
+        for pos, translation in zip(new, ee.get_translations([texts[pos] for pos in new], str(src), str(trg))):
+            translations[pos] = translation
+    missing = [pos for pos in new if not translations[pos]]
+    if translator == "hf":
+        missing_translations = huggingface_translate_batch([texts[pos] for pos in missing], src, trg)
+    else:
+        missing_translations = [func(texts[pos], src, trg) for pos in missing]
+    for pos, translation in zip(missing, missing_translations):
+        translations[pos] = translation
+    trm.MEMORY.store({texts[pos]: translations[pos] for pos in new}, src, trg, backend, model)
+    return translations
 
 def tknzr(text):
     """tokenizer for spaces, underscores, camelcase, and dromedacase"""
     regex = r'[A-ZÁÀÂÇÉÈÊÔÚÙÛÄÖÜ]?[a-záàâçéèêôúùûäöü]+|[A-ZÁÀÂÇÉÈÊÔÚÙÛÄÖÜ]+(?=[A-ZÁÀÂÇÉÈÊÔÚÙÛÄÖÜ]|$)'
     return " ".join(re.findall(regex, text)).lower()
 
-def extract_label(elem, elem_type):
-    """extract certain POS for classes, ops, and dps"""
-    # NOTE: add 'DEP':'advmod' and 'DEP':'amod' for further restrictions
-    class_pattern_1 = [{'POS':'ADV','OP':'*'},{'POS':'ADJ','OP':'*'},{'POS':'VERB','OP':'*'},{'POS':'PROPN', 'OP':'*'},{'POS':'NOUN','OP':'+'}]
-    op_pattern_1 = [{'POS':'AUX','OP':'*'},{'POS':'ADV','OP':'*'},{'POS':'VERB'},{'POS':'ADP','OP':'*'}]
-    # NOTE: op_pattern_2 catches cases of misclassification such as "lower"
-    op_pattern_2 = [{'POS':'ADJ'}]
-    dp_pattern_1 = [{'POS':'ADV','DEP':'advmod','OP':'*'},{'POS':'ADJ','DEP':'amod','OP':'*'},{'POS':'NOUN'}]
-    dp_pattern_2 = [{'POS':'ADV','OP':'*'},{'POS':'ADJ','OP':'*'},{'POS':'PROPN'}]
-    matcher = Matcher(NLP.vocab)
-    if elem_type == "owl:Class":
-        matcher.add("class_matcher", None, class_pattern_1)
-    elif elem_type == "owl:ObjectProperty":
-        matcher.add("op_matcher", None, op_pattern_1, op_pattern_2)
-    elif elem_type == "owl:DatatypeProperty":
-        matcher.add("dp_matcher", None, dp_pattern_1, dp_pattern_2)
+@functools.lru_cache(maxsize=None)
+def detect_language(text):
+    """detect language of normalized text, each text is only detected once"""
+    return detect(text)
+
+@functools.lru_cache(maxsize=None)
+def spellcheck(text):
+    """correct spelling of normalized English text, each text is only corrected once"""
+    return spelchek.correct(text)
+
+def get_namespace(elem):
+    """return onto namespace of an element"""
+    # NOTE: assumes that # is used to separate entity name from onto name
+    return elem.rsplit("#", 1)[0]
+
+def get_detection_text(elem):
+    """return the normalized text the language of an untagged elem is detected from, None if not needed"""
+    classname = reduce_to_class(str(elem[0]))
+    if elem[1] and not elem[2]:
+        return tknzr(str(elem[1]))
+    if not elem[1] and not elem[2] and len(classname) > 1:
+        return tknzr(classname)
+    return None
+
+def detect_languages(elems, namespace_vote=NAMESPACE_VOTE):
+    """
+    detect the languages of all untagged elems in one pass
+    :param elems: list of elems of the form (elem, label, language)
+    :param namespace_vote: assign the most common language per namespace to all untagged elems in it
+    :return: list of detected languages in the order of elems, None for elems w/o detection
+    """
+    langs = [detect_language(text) if text else None for text in map(get_detection_text, elems)]
+    if namespace_vote:
+        votes = defaultdict(Counter)
+        for elem, lang in zip(elems, langs):
+            if lang:
+                votes[get_namespace(str(elem[0]))][lang] += 1
+        langs = [votes[get_namespace(str(elem[0]))].most_common(1)[0][0] if lang else None
+                 for elem, lang in zip(elems, langs)]
+    return langs
+
+def extract_label(elem, elem_type, doc=None):
+    """
+    extract certain POS for classes, ops, and dps
+    :param doc: spacy doc for elem, processed on demand if not provided
+    """
     label = elem
-    doc = NLP(elem)
-    matched = [doc[start:end].text for match_id, start, end in matcher(doc)]
+    if doc is None:
+        doc = NLP(elem)
+    matched = [doc[start:end].text for match_id, start, end in LABEL_MATCHERS[elem_type](doc)]
     if matched:
         label = sorted(matched, key=len, reverse=True)[0]
     return label
 
-def add_label(elem, elem_type, target_lang, source_lang):
-    """translate input and add respective label"""
+def get_label_source(elem, target_lang, source_lang, detected_lang=None):
+    """
+    determine the text a label in target_lang is derived from
+    :param detected_lang: language detected beforehand, detected on demand if not provided
+    :return: tuple of text and its language if it needs to be translated, language is None
+        if the text can be used as label directly; None if no label can be derived
+    """
     # NOTE: language detection does not work reliably for single words
     # NOTE: language detection does not work in case of typos
-    label_default = None
+    source = None
     classname = reduce_to_class(str(elem[0]))
     if elem[1] and elem[2] and elem[2] != target_lang:
-        label_default = two_stage_translate(tknzr(str(elem[1])), elem[2], target_lang).lower()
+        source = (tknzr(str(elem[1])), elem[2])
     elif elem[1] and not elem[2]:
-        if not source_lang:
-            detected_lang = detect(tknzr(elem[1]))
-        else:
-            detected_lang = source_lang
+        detected_lang = source_lang or detected_lang or detect_language(get_detection_text(elem))
         if detected_lang == target_lang:
             if SPELLCHECK and target_lang == "en":
             # NOTE: as of now, spellchecker only works for English
-                label_default = spelchek.correct(tknzr(elem[1]))
+                source = (spellcheck(tknzr(elem[1])), None)
             else:
-                label_default = tknzr(elem[1])
+                source = (tknzr(elem[1]), None)
         else:
-            label_default = two_stage_translate(tknzr(str(elem[1])), detected_lang, target_lang).lower()
+            source = (tknzr(str(elem[1])), detected_lang)
     elif not elem[1] and not elem[2] and len(classname) > 1:
-        if not source_lang:
-            detected_lang = detect(tknzr(classname))
-        else:
-            detected_lang = source_lang
         # possibly use spacy instead to improve reliability
+        detected_lang = source_lang or detected_lang or detect_language(get_detection_text(elem))
         if detected_lang == target_lang:
             if SPELLCHECK and target_lang == "en":
             # NOTE: as of now, spellchecker only works for English
-                label_default = spelchek.correct(tknzr(classname))
+                source = (spellcheck(tknzr(classname)), None)
             else:
-                label_default = tknzr(classname)
+                source = (tknzr(classname), None)
         else:
-            label_default = two_stage_translate(tknzr(classname), detected_lang, target_lang).lower()
+            source = (tknzr(classname), detected_lang)
     elif not elem[1] and not elem[2] and len(classname) <= 1:
-        label_default = classname
+        source = (classname, None)
+    return source
+
+def write_label(elem, elem_type, label_default, target_lang, doc=None, world=IRIS):
+    """add label in target_lang, reduced to the relevant POS"""
     if label_default:
-        getattr(IRIS[str(elem[0])], "label").extend([locstr(extract_label(label_default, elem_type), lang=target_lang)])
+        getattr(world[str(elem[0])], "label").extend([locstr(extract_label(label_default, elem_type, doc),
+                                                            lang=target_lang)])
+
+def add_label(elem, elem_type, target_lang, source_lang, world=IRIS):
+    """translate input and add respective label"""
+    source = get_label_source(elem, target_lang, source_lang)
+    if source:
+        text, src = source
+        label_default = two_stage_translate(text, src, target_lang).lower() if src else text
+        write_label(elem, elem_type, label_default, target_lang, world=world)
+
+def add_labels(elems, target_lang, source_lang, world=IRIS):
+    """
+    translate inputs and add respective labels
+    languages of untagged elems are detected at once, texts are then grouped by source language
+    so that each group is translated in one pass, labels are then written back at once
+    :param elems: list of tuples of elem and elem type
+    :param world: owlready2 world the labels are added to
+    """
+    detected = detect_languages([elem for elem, _ in elems]) if not source_lang else [None] * len(elems)
+    sources = [get_label_source(elem, target_lang, source_lang, lang) for (elem, _), lang in zip(elems, detected)]
+    texts_by_lang = defaultdict(dict)
+    for source in sources:
+        if source and source[1]:
+            texts_by_lang[str(source[1])][source[0]] = None
+    translations = {}
+    for src, texts in texts_by_lang.items():
+        translations[src] = dict(zip(texts, two_stage_translate_batch(list(texts), src, target_lang)))
+    labels = []
+    for source in sources:
+        if not source:
+            labels.append(None)
+        elif source[1]:
+            labels.append(translations[str(source[1])][source[0]].lower())
+        else:
+            labels.append(source[0])
+    positions = [pos for pos, label in enumerate(labels) if label]
+    docs = NLP.pipe([labels[pos] for pos in positions], batch_size=SPACY_BATCH_SIZE)
+    for pos, doc in zip(positions, docs):
+        write_label(elems[pos][0], elems[pos][1], labels[pos], target_lang, doc, world)
 
 def main(onto, iri, target, target_lang=DEFAULT_LANG, source_lang=None):
     """add labels in language specified, defaults to English"""
-    classes = query_onto(onto, create_query(iri, "owl:Class"))
-    objprops = query_onto(onto, create_query(iri, "owl:ObjectProperty"))
-    dataprops = query_onto(onto, create_query(iri, "owl:DatatypeProperty"))
-    # remove BNodes from classes
-    classes = [c for c in classes if str(type(c[0])) != "<class 'rdflib.term.BNode'>"]
-    # NOTE: this removes multiple labels - does not prioritize yet though
-    classes = [c for n, c in enumerate(classes) if c[0] not in [cl[0] for cl in classes[:n]]]
-    objprops = [c for n, c in enumerate(objprops) if c[0] not in [cl[0] for cl in objprops[:n]]]
-    dataprops = [c for n, c in enumerate(dataprops) if c[0] not in [cl[0] for cl in dataprops[:n]]]
-    onto = get_ontology(onto).load()
-    with onto:
-        for elem in classes:
-            if not any(e[0] == elem[0] and str(e[2]) == target_lang for e in classes):
-                add_label(elem, "owl:Class", target_lang, source_lang)
-        for op in objprops:
-            if not any(e[0] == op[0] and str(e[2]) == target_lang for e in objprops):
-                add_label(op, "owl:ObjectProperty", target_lang, source_lang)
-        for dp in dataprops:
-            if not any(e[0] == dp[0] and str(e[2]) == target_lang for e in dataprops):
-                add_label(dp, "owl:DatatypeProperty", target_lang, source_lang)
-    onto.save(file=target)
+    # NOTE: the onto is loaded once via the registry, labels are added to the registry's world
+    elems = get_elems_to_label(query_onto(onto, create_query(iri)), target_lang)
+    loaded = reg.REGISTRY.get(onto)
+    with loaded.onto:
+        add_labels(elems, target_lang, source_lang, loaded.world)
+    loaded.onto.save(file=target)
+    # NOTE: the registry's version of the onto has been modified and is thus not valid anymore
+    reg.REGISTRY.invalidate(onto)
 
 if __name__ == "__main__":
     onto_fr = "file://./../data/onto-fr.owl"
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+persistent translation memory shared by all translation backends
+translations are stored in an sqlite file keyed by the normalized text, the language pair,
+the backend, and the model so that re-merging new versions of an ontology does not
+translate the same labels again; several pipeline processes may use the same file
+"""
+
+import atexit
+import sqlite3
+import time
+import yaml
+
+with open("config.yml", "r") as ymlfile:
+    cfg = yaml.safe_load(ymlfile)
+    MEMORY_FILE = cfg["settings"]["translation-memory"]["file"]
+    TTL_DAYS = cfg["settings"]["translation-memory"]["ttl-days"]
+    MAX_ENTRIES = cfg["settings"]["translation-memory"]["max-entries"]
+
+
+class TranslationMemory:
+    """sqlite based translation cache w expiry and size limit"""
+
+    def __init__(self, path: str = MEMORY_FILE, ttl_days: float = TTL_DAYS, max_entries: int = MAX_ENTRIES) -> None:
+        """ init
+
+        :param path: path to sqlite file; translations are only kept for the current process if None
+        :param ttl_days: days after which translations expire, no expiry if None
+        :param max_entries: maximum number of translations, least recently used ones are evicted first
+        """
+        self.path: str = path
+        self.ttl: float = ttl_days * 86400 if ttl_days else None
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self._connection = None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """normalize whitespace and case of texts used as keys"""
+        return " ".join(str(text).split()).lower()
+
+    def _connect(self):
+        """ open sqlite store lazily; WAL mode allows processes to read while another one writes
+        NOTE: expired entries are removed when connecting and after storing new entries
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path or ":memory:", timeout=30)
+            if self.path:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS translations (text TEXT, src TEXT, trg TEXT, "
+                                     "backend TEXT, model TEXT, translation TEXT, created REAL, accessed REAL, "
+                                     "PRIMARY KEY (text, src, trg, backend, model))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS accessed_idx ON translations (accessed)")
+            self._evict()
+            atexit.register(self.close)
+        return self._connection
+
+    def lookup(self, texts: list, src: str, trg: str, backend: str, model: str = "") -> dict:
+        """ look up translations and count hits and misses
+
+        :param texts: texts to be translated
+        :param src: source language
+        :param trg: target language
+        :param backend: translation backend
+        :param model: model used by the backend
+        :return: dict w translations for the texts that are available
+        """
+        connection = self._connect()
+        now = time.time()
+        found = {}
+        with connection:
+            for text in dict.fromkeys(texts):
+                key = (self.normalize(text), str(src), str(trg), backend, model)
+                row = connection.execute("SELECT translation, created FROM translations WHERE text=? AND src=? "
+                                         "AND trg=? AND backend=? AND model=?", key).fetchone()
+                if row and (self.ttl is None or now - row[1] <= self.ttl):
+                    found[text] = row[0]
+                    connection.execute("UPDATE translations SET accessed=? WHERE text=? AND src=? AND trg=? "
+                                       "AND backend=? AND model=?", (now,) + key)
+        self.hits += sum(1 for text in texts if text in found)
+        self.misses += sum(1 for text in texts if text not in found)
+        return found
+
+    def store(self, translations: dict, src: str, trg: str, backend: str, model: str = "") -> None:
+        """ store translations and evict entries if the size limit is exceeded
+
+        :param translations: dict w texts as keys and their translations as values
+        :param src: source language
+        :param trg: target language
+        :param backend: translation backend
+        :param model: model used by the backend
+        """
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [(self.normalize(text), str(src), str(trg), backend, model, translation, now, now)
+                                    for text, translation in translations.items() if translation])
+        self._evict()
+
+    def _evict(self) -> None:
+        """remove expired translations and least recently used ones beyond the size limit"""
+        with self._connection:
+            if self.ttl is not None:
+                self._connection.execute("DELETE FROM translations WHERE created < ?", (time.time() - self.ttl,))
+            if self.max_entries:
+                self._connection.execute("DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations "
+                                         "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def close(self) -> None:
+        """close sqlite store"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def cache_info(self) -> dict:
+        """return hit and miss counters"""
+        size = self._connect().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "size": size,
+                "maxsize": self.max_entries}
+
+
+MEMORY = TranslationMemory()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+benchmark the lemma index based explicit comparison against the exhaustive comparison
+uses synthetic label infos of increasing size and checks that both return the same matches
+Usage: python benchmark_explicit_compare.py [max_size]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+# NOTE: modules in src/ expect to be run from within src/ due to relative config paths
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+os.chdir(SRC_DIR)
+sys.path.insert(0, SRC_DIR)
+
+import compare_by_labels as cbl
+
+SIZES = [100, 250, 500, 1000, 2000]
+VOCAB_SIZE = 2000
+MAX_TOKENS = 3
+
+
+def create_label_infos(size: int, prefix: str, seed: int) -> list:
+    """ create synthetic label infos of the form [IRI, label, [[text, lemma, pos, tag, dep], ...], passive]
+
+    :param size: number of labels
+    :param prefix: namespace used for the synthetic IRIs
+    :param seed: seed for reproducible label infos
+    :return: list of label infos
+    """
+    rng = random.Random(seed)
+    label_infos = []
+    for i in range(size):
+        lemmas = ["lemma" + str(rng.randrange(VOCAB_SIZE)) for _ in range(rng.randint(1, MAX_TOKENS))]
+        tokens = [[lemma, lemma, "NOUN", "NN", "ROOT"] for lemma in lemmas]
+        label_infos.append([prefix + "#elem" + str(i), " ".join(lemmas), tokens, rng.choice([None, True, False])])
+    return label_infos
+
+
+def run_benchmark(sizes: list) -> None:
+    print("size, exhaustive [s], indexed [s], speedup, matches")
+    for size in sizes:
+        infos1 = create_label_infos(size, "http://example.org/bench-1.owl", size)
+        infos2 = create_label_infos(size, "http://example.org/bench-2.owl", size + 1)
+        tic = timeit.default_timer()
+        exhaustive = cbl.explicit_compare_deprecated(infos1, infos2, "owl:Class")
+        toc = timeit.default_timer()
+        indexed = cbl.explicit_compare(infos1, infos2, "owl:Class")
+        tac = timeit.default_timer()
+        assert exhaustive == indexed, f"results differ for size {size}"
+        print(f"{size}, {toc-tic:.4f}, {tac-toc:.4f}, {(toc-tic)/max(tac-toc, 1e-9):.1f}, {len(indexed)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_benchmark([s for s in SIZES if s <= int(sys.argv[1])] or [int(sys.argv[1])])
+    else:
+        run_benchmark(SIZES)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+check the grouped reduce_vector and reduce_prop_vector against the pairwise implementations
+randomized matching vectors are compared first, then both variants are timed for increasing sizes
+Usage: python benchmark_reduce_vector.py [iterations]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+# NOTE: modules in src/ expect to be run from within src/ due to relative config paths
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+os.chdir(SRC_DIR)
+sys.path.insert(0, SRC_DIR)
+
+import compare_by_labels as cbl
+import compare_by_structure as cbs
+
+RELATIONS = ["equivalence", "hypernym", "hyponym", "disjoint", "inverse"]
+SIZES = [100, 250, 500, 1000]
+
+
+def create_matches(rng: random.Random, size: int, notions: int, ratings: list) -> list:
+    """ create random matches of the form [elem_type, iri1, iri2, relation, rating]; includes
+    matches that appear twice as well as equal copies of matches
+
+    :param rng: random number generator
+    :param size: number of matches
+    :param notions: number of notions per ontology
+    :param ratings: ratings to choose from, few ratings result in many ties
+    :return: list of matches
+    """
+    matches = [[rng.choice(["owl:Class", "owl:ObjectProperty"]),
+                "http://example.org/onto-1.owl#n" + str(rng.randrange(notions)),
+                "http://example.org/onto-2.owl#n" + str(rng.randrange(notions)),
+                rng.choice(RELATIONS), rng.choice(ratings)] for _ in range(size)]
+    if matches and rng.random() < .3:
+        matches.append(matches[rng.randrange(len(matches))])
+    if matches and rng.random() < .3:
+        matches.append(list(matches[rng.randrange(len(matches))]))
+    rng.shuffle(matches)
+    return matches
+
+
+def check_equivalence(iterations: int) -> None:
+    rng = random.Random(0)
+    for _ in range(iterations):
+        matches = create_matches(rng, rng.randint(0, 15), rng.randint(1, 4), [.1, .5, .9])
+        assert cbl.reduce_vector(matches) == cbl.reduce_vector_deprecated(matches), matches
+        assert cbs.reduce_prop_vector(matches) == cbs.reduce_prop_vector_deprecated(matches), matches
+    print(f"grouped and pairwise reduction agree for {iterations} random vectors")
+
+
+def run_benchmark(sizes: list) -> None:
+    rng = random.Random(1)
+    print("function, size, pairwise [s], grouped [s]")
+    for size in sizes:
+        matches = create_matches(rng, size, max(1, size // 5), [round(rng.random(), 2) for _ in range(20)])
+        for name, grouped, pairwise in (("reduce_vector", cbl.reduce_vector, cbl.reduce_vector_deprecated),
+                                        ("reduce_prop_vector", cbs.reduce_prop_vector,
+                                         cbs.reduce_prop_vector_deprecated)):
+            tic = timeit.default_timer()
+            expected = pairwise(matches)
+            toc = timeit.default_timer()
+            result = grouped(matches)
+            tac = timeit.default_timer()
+            assert expected == result, f"results differ for {name} and size {size}"
+            print(f"{name}, {size}, {toc-tic:.4f}, {tac-toc:.4f}")
+
+
+if __name__ == "__main__":
+    check_equivalence(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+    run_benchmark(SIZES)
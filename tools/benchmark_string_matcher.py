@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+check the blocked rapidfuzz string matching against the exhaustive python matching
+random lists are compared first, incl. thresholds of 0, then both variants are timed for increasing sizes
+Usage: python benchmark_string_matcher.py [iterations]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+# NOTE: modules in src/ expect to be run from within src/ due to relative config paths
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+os.chdir(SRC_DIR)
+sys.path.insert(0, SRC_DIR)
+
+import string_matcher as sm
+
+THRESHOLDS = [0., 1e-7, .1, .3, .5, .7, .9]
+SIZES = [100, 500, 1000, 2000]
+
+
+def create_list(rng: random.Random, size: int, prefix: str) -> list:
+    """ create random tuples of the form (uid, string) w non-empty strings from a small alphabet
+
+    :param rng: random number generator
+    :param size: number of tuples
+    :param prefix: prefix for the uids
+    :return: list of tuples
+    """
+    return [(f"{prefix}{i}", "".join(rng.choice("abcd") for _ in range(rng.randint(1, 10)))) for i in range(size)]
+
+
+def match(list1: list, list2: list, threshold: float, **kwargs) -> sm.StringMatcher:
+    """match the strings of two lists, kwargs are passed to match_lists"""
+    matcher = sm.StringMatcher(list1, list2, 1, 1, threshold)
+    matcher.match_lists(**kwargs)
+    return matcher
+
+
+def check_equivalence(iterations: int) -> None:
+    """ compare matches and alignment scores of the blocked rapidfuzz matching w the python matching
+
+    :param iterations: number of random list pairs
+    """
+    rng = random.Random(0)
+    for _ in range(iterations):
+        list1 = create_list(rng, rng.randint(0, 6), "a")
+        list2 = create_list(rng, rng.randint(0, 6), "b")
+        threshold = rng.choice(THRESHOLDS)
+        expected = match(list1, list2, threshold)
+        expected = [m for m in expected.matches if m[2] > threshold]
+        # NOTE: a tile size of 4 enforces several chunks of rows
+        matcher = sm.StringMatcher(list1, list2, 1, 1, threshold)
+        matcher._match_lists_matrix(blocked=True, workers=1, tile_size=4)
+        assert matcher.matches == expected, (list1, list2, threshold)
+        assert match(list1, list2, threshold, blocked=True, backend="rapidfuzz").matches == expected
+        reference = match(list1, list2, threshold, blocked=True)
+        for method in "greedy", "optimal_lsa":
+            matcher.calc_alignment(method)
+            reference.calc_alignment(method)
+            assert matcher.score == reference.score, (list1, list2, threshold, method)
+    print(f"blocked rapidfuzz and exhaustive python matching agree for {iterations} random lists")
+
+
+def run_benchmark(sizes: list) -> None:
+    """ time blocked python and blocked rapidfuzz matching and check that their matches agree
+
+    :param sizes: numbers of strings per list
+    """
+    rng = random.Random(1)
+    print("size, python blocked [s], rapidfuzz blocked [s], stored scores")
+    for size in sizes:
+        list1, list2 = create_list(rng, size, "a"), create_list(rng, size, "b")
+        tic = timeit.default_timer()
+        expected = match(list1, list2, .5, blocked=True)
+        toc = timeit.default_timer()
+        result = match(list1, list2, .5, blocked=True, backend="rapidfuzz")
+        tac = timeit.default_timer()
+        assert expected.matches == result.matches, f"results differ for size {size}"
+        print(f"{size}, {toc-tic:.4f}, {tac-toc:.4f}, {result.scores.nnz}")
+
+
+if __name__ == "__main__":
+    check_equivalence(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
+    run_benchmark(SIZES)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+compare CPU inference profiles for translating the labels of the bundled onto-fr
+each profile is timed on all labels; int8 and greedy outputs are compared to the fp32 default
+Usage: python benchmark_translation.py [repetitions]
+"""
+
+import os
+import sys
+import timeit
+
+# NOTE: modules in src/ expect to be run from within src/ due to relative config paths
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+os.chdir(SRC_DIR)
+sys.path.insert(0, SRC_DIR)
+
+import model_registry as mtr
+import onto_fr
+import translate_onto as to
+from owlready2 import get_ontology
+
+# NOTE: profiles as (name, quantize, num_beams); None uses the model's default beam search
+PROFILES = [("fp32", False, None),
+            ("fp32-greedy", False, 1),
+            ("int8", True, None),
+            ("int8-greedy", True, 1)]
+
+
+def get_labels() -> list:
+    """French and untagged labels of all entities in onto-fr, the onto is created first if necessary"""
+    if not os.path.exists(onto_fr.FILE):
+        onto_fr.main()
+    onto = get_ontology(onto_fr.FILE).load()
+    entities = list(onto.classes()) + list(onto.properties())
+    # NOTE: translate_onto saves English labels to onto-fr, these must not be translated from French
+    return [to.tknzr(str(label)) for entity in entities for label in entity.label
+            if getattr(label, "lang", "") in ("fr", "")]
+
+
+def run_benchmark(labels: list, repetitions: int) -> None:
+    """ translate labels w each profile and report throughput and agreement w the fp32 default
+
+    :param labels: labels to be translated from French to English
+    :param repetitions: number of timed runs per profile
+    """
+    print(f"{len(labels)} labels, {repetitions} repetitions, {mtr.torch.get_num_threads()} threads")
+    print("profile, labels/s, agreement w fp32")
+    reference = None
+    for name, quantize, num_beams in PROFILES:
+        # NOTE: warm-up call so that loading the model is not timed
+        result = to.huggingface_translate_batch(labels, "fr", "en", num_beams=num_beams, quantize=quantize)
+        tic = timeit.default_timer()
+        for _ in range(repetitions):
+            to.huggingface_translate_batch(labels, "fr", "en", num_beams=num_beams, quantize=quantize)
+        toc = timeit.default_timer()
+        if reference is None:
+            reference = result
+        agreement = sum(r == t for r, t in zip(reference, result)) / len(labels)
+        print(f"{name}, {len(labels) * repetitions / (toc - tic):.1f}, {agreement:.2%}")
+        for label, ref, trans in zip(labels, reference, result):
+            if ref != trans:
+                print(f"  {label}: {ref} | {trans}")
+
+
+if __name__ == "__main__":
+    run_benchmark(get_labels(), int(sys.argv[1]) if len(sys.argv) > 1 else 5)